@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Capture file of data sent and received on a serial port
+#
+# File:     capture.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:
+# Date:     2026-10-18
+# License:  MIT
+# Python:   >= 3.0
+#
+# ----------------------------------------------------------------------------
+#
+# File format, all integers little endian
+#
+#   MAGIC                    8 bytes, once at start of file
+#   record                   repeated
+#     type                   u8   Direction
+#     time                   u64  Monotonic clock in ns
+#     length                 u32  Payload length
+#     payload                length bytes
+#     crc                    u32  CRC-32 of type, time, length and payload
+#
+# Every recording starts with a SESSION record holding the wall clock time
+# in ns (u64), so monotonic times can be related to wall clock time, and
+# recordings can be appended to an existing file. A record cut short by a
+# crash is detected by its length or crc, reading stops there and it is
+# removed when the file is opened for appending.
+#
+
+from __future__ import annotations
+from dataclasses import dataclass
+from enum import Enum
+from typing import BinaryIO, Iterator
+import os
+import struct
+import time
+import zlib
+
+MAGIC = b"MPCAP\x00\x01\n"
+HEADER = struct.Struct("<BQI")
+CRC = struct.Struct("<I")
+WALL_CLOCK = struct.Struct("<Q")
+
+
+class Direction(Enum):
+    RX = 1  # Received from device
+    TX = 2  # Sent to device
+    SESSION = 3  # Start of recording, payload is wall clock time
+
+
+@dataclass
+class CaptureRecord:
+    direction: Direction
+    time: int  # Monotonic clock in ns
+    data: bytes
+
+    def wall_clock(self) -> int:
+        """Wall clock time in ns of a SESSION record"""
+        return WALL_CLOCK.unpack(self.data)[0]
+
+
+def read_records(file: BinaryIO) -> Iterator[tuple[int, CaptureRecord]]:
+    """Read records from file positioned after MAGIC. Yield file offset after
+    each record and the record, stop at end of file or a broken record."""
+    directions = [d.value for d in Direction]
+    offset = file.tell()
+    while True:
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return
+        dir_value, timestamp, length = HEADER.unpack(header)
+        if dir_value not in directions:
+            return
+        data = file.read(length)
+        crc = file.read(CRC.size)
+        if len(data) < length or len(crc) < CRC.size:
+            return
+        if CRC.unpack(crc)[0] != zlib.crc32(data, zlib.crc32(header)):
+            return
+        offset += HEADER.size + length + CRC.size
+        yield offset, CaptureRecord(Direction(dir_value), timestamp, data)
+
+
+def read_capture(filename: str) -> Iterator[CaptureRecord]:
+    """Read all records of a capture file.
+
+    Raises:
+        ValueError: File is not a capture file
+    """
+    with open(filename, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{filename} is not a capture file")
+        for _, record in read_records(file):
+            yield record
+
+
+def valid_length(file: BinaryIO) -> int:
+    """Return length of file up to the end of the last complete record"""
+    file.seek(0)
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{file.name} is not a capture file")
+    end = len(MAGIC)
+    for end, _ in read_records(file):
+        pass
+    return end
+
+
+class CaptureWriter:
+    """Appends records to a capture file.
+
+    Records are collected in a buffer, written to the file when it is full
+    and synced to disk at most FLUSH_INTERVAL seconds after being added,
+    by write or by calling poll when idle.
+    """
+
+    BUFFER_SIZE = 1 << 16  # Bytes collected before written to file
+    FLUSH_INTERVAL = 1.0  # Max seconds before data is synced to disk
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            self.file = open(filename, "r+b")
+            self.file.truncate(valid_length(self.file))  # Drop broken record
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.file = open(filename, "wb")
+            self.file.write(MAGIC)
+
+        self.buf = bytearray()
+        self.unsynced: float = None  # Time of oldest data not synced to disk
+        self.write(Direction.SESSION, WALL_CLOCK.pack(time.time_ns()))
+        self.flush()
+
+    def write(self, direction: Direction, data: bytes) -> None:
+        header = HEADER.pack(direction.value, time.monotonic_ns(), len(data))
+        self.buf += header
+        self.buf += data
+        self.buf += CRC.pack(zlib.crc32(data, zlib.crc32(header)))
+        if len(self.buf) >= self.BUFFER_SIZE:
+            self.file.write(self.buf)
+            self.buf.clear()
+
+        if self.unsynced is None:
+            self.unsynced = time.monotonic()
+        self.poll()
+
+    def poll(self) -> None:
+        """Sync to disk if data was added more than FLUSH_INTERVAL ago"""
+        if (
+            self.unsynced is not None
+            and time.monotonic() - self.unsynced >= self.FLUSH_INTERVAL
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered records and sync file to disk"""
+        self.file.write(self.buf)
+        self.buf.clear()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = None
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+
+def main() -> None:
+    pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Incremental UTF-8 decoding of data received in chunks
+#
+# File:     decoder.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:
+# Date:     2026-10-18
+# License:  MIT
+# Python:   >= 3.0
+#
+# ----------------------------------------------------------------------------
+#
+# A multibyte character may be split between two reads from a serial port or
+# a process. StreamDecoder keeps the incomplete bytes at the end of a chunk
+# and decodes them together with the next one, every byte is decoded once.
+#
+
+from __future__ import annotations
+from enum import Enum
+import codecs
+
+
+def latin1_pass(error: UnicodeDecodeError) -> tuple[str, int]:
+    """Decode error handler passing invalid bytes through as Latin-1"""
+    return error.object[error.start : error.end].decode("latin-1"), error.end
+
+
+codecs.register_error("latin1pass", latin1_pass)
+
+
+class DecodeErrors(Enum):
+    """Handling of bytes that are not valid UTF-8"""
+
+    REPLACE = "replace"  # Replaced by U+FFFD
+    HEX = "backslashreplace"  # Escaped as \xNN
+    LATIN1 = "latin1pass"  # Passed through as Latin-1 characters
+
+    @staticmethod
+    def names() -> list[str]:
+        return [errors.name.lower() for errors in DecodeErrors]
+
+    @staticmethod
+    def from_name(name: str) -> DecodeErrors:
+        return DecodeErrors[name.upper()]
+
+
+class StreamDecoder:
+    """Stateful UTF-8 decoder for a stream of byte chunks"""
+
+    def __init__(self, errors: DecodeErrors = DecodeErrors.REPLACE) -> None:
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors.value)
+        self.errors = errors
+
+    def set_errors(self, errors: DecodeErrors) -> None:
+        """Set error policy, bytes of an incomplete character are kept"""
+        self.errors = errors
+        self.decoder.errors = errors.value
+
+    def decode(self, data, final: bool = False) -> str:
+        """Decode chunk of bytes (bytes, bytearray or QByteArray). An
+        incomplete character at the end is returned with the next chunk,
+        or decoded with the error policy if final is set."""
+        return self.decoder.decode(bytes(data), final)
+
+    def pending(self) -> bytes:
+        """Return bytes of an incomplete character kept for the next chunk"""
+        return self.decoder.getstate()[0]
+
+    def reset(self) -> None:
+        self.decoder.reset()
+
+
+def main() -> None:
+    pass
+
+
+if __name__ == "__main__":
+    main()
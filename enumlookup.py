@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Constant time value to enum member lookup
+#
+# File:     enumlookup.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:
+# Date:     2026-10-18
+# License:  MIT
+# Python:   >= 3.0
+#
+# ----------------------------------------------------------------------------
+
+from enum import Enum
+from typing import Any
+
+
+class EnumLookup:
+    """Value to member table for an Enum, built once when created.
+
+    Values not present in the Enum decodes to the default member, usually
+    UNSUPPORTED, instead of raising ValueError as Enum(value) does.
+    """
+
+    def __init__(self, enum_type: type[Enum], default: Enum) -> None:
+        self.table: dict[Any, Enum] = {member.value: member for member in enum_type}
+        self.default = default
+
+    def __call__(self, value: Any) -> Enum:
+        return self.table.get(value, self.default)
+
+    def __contains__(self, value: Any) -> bool:
+        return value in self.table
+
+
+def main() -> None:
+    pass
+
+
+if __name__ == "__main__":
+    main()
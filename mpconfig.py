@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Settings, profile and command line of mpterm
+#
+# File:     mpconfig.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:
+# Date:     2026-10-18
+# License:  MIT
+# Python:   >= 3.0
+#
+# ----------------------------------------------------------------------------
+#
+# Kept apart from the GUI so the headless mode can run without loading
+# PyQt5.QtWidgets.
+#
+
+import sys
+import os
+import logging
+import argparse
+import signal
+import enum
+import json
+from dataclasses import dataclass, field
+
+from mptrace import Trace
+from escape import Ansi
+from serialport import ReadMode, SerialPort
+from decoder import DecodeErrors
+from replay import CaptureReplay
+from macro import Macro
+
+# Settings ------------------------------------------------------------------
+
+# Absolute path to script itself
+self_dir = os.path.abspath(os.path.dirname(sys.argv[0]))
+
+
+class App:
+    NAME = "mpterm"
+    VERSION = "0.51"
+    DESCRIPTION = "MpTerm is a simple serial terminal program, aimed at embedded systems development"
+    LICENSE = ""
+    AUTHOR = "Peter Malmberg"
+    EMAIL = "peter.malmberg@gmail.com"
+    ORG = ""
+    HOME = "github.com/zonbrisad/mpterm"
+    ICON = f"{self_dir}/icons/mp_icon2_128x128.png"
+    MAX_LINES = 150
+    FRAME_RATE = 60  # Max terminal updates per second
+    RECEIVE_BUFFER = 256  # Bytes per read, smallest size in adaptive mode
+    READ_BATCH = 10  # Max ms received data is held for one pass under load
+    CAPTURE_FILTER = "Capture files (*.mpcap);;All files (*)"
+    REPLAY_SPEEDS = {  # Replay speed factor by name
+        "Original": 1.0,
+        "10x": 10.0,
+        "100x": 100.0,
+        "Max": CaptureReplay.MAX_SPEED,
+    }
+    MACROS = 10
+    SETTINGS_FILE = f"{self_dir}/mpterm.json"
+
+
+# Definitions ---------------------------------------------------------------
+
+
+class MpState(enum.Enum):
+    """Enumeration for terminal state machine"""
+
+    DISCONNECTED = 0
+    CONNECTED = 1
+    SUSPENDED = 2
+    RECONNECTING = 3
+    EXTERNAL = 4
+    PAUSED = 5
+
+
+class MpTerm(enum.Enum):
+    # Display modes
+    Ascii = "Ascii"
+    Hex = "Hex"
+    AsciiHex = "AsciiHex"
+    Terminal = "Terminal"
+
+    # Newline modes
+    Nl = 0
+    Cr = 1
+    NlCr = 2
+
+
+# Code ----------------------------------------------------------------------
+
+
+@dataclass
+class mpProfile:
+    """Class for handling profile settings"""
+
+    alias: str = "default"
+    port: str = ""
+    bitrate: str = "38400"
+    databits: str = "8"
+    parity: str = "None"
+    stopbits: str = "1"
+    flowcontrol: str = "None"
+    mode: str = MpTerm.Ascii.name
+    suspend_timeout: int = 8
+    ext_program: str = ""
+    newline: str = "\n"
+    win_x: int = 850
+    win_y: int = 500
+    sync_string: str = ""
+    columns: int = 10
+    read_buffer: int = App.RECEIVE_BUFFER
+    read_mode: str = ReadMode.ADAPTIVE.name
+    read_batch: int = App.READ_BATCH
+    macros: list[Macro] = field(default_factory=list)
+    plugin: str = ""
+    key_list = [
+        "alias",
+        "port",
+        "bitrate",
+        "databits",
+        "parity",
+        "stopbits",
+        "flowcontrol",
+        "mode",
+        "suspend_timeout",
+        "ext_program",
+        "newline",
+        "win_x",
+        "win_y",
+        "sync_string",
+        "columns",
+        "plugin",
+        "read_buffer",
+        "read_mode",
+        "read_batch",
+    ]
+    filename: str = ""
+
+    def __post_init__(self):
+        for nm in range(App.MACROS):
+            m = Macro(name=f"M{nm+1}")
+            self.macros.append(m)
+
+    def set_member(self, key, dict):
+        val = dict.get(key, getattr(self, key))
+        logging.debug(f"{key} = {val}")
+        setattr(self, key, val)
+
+    def to_json(self) -> dict:
+        jsonDict = {}
+        for key in self.key_list:
+            jsonDict[key] = getattr(self, key)
+
+        macro_dicts = []
+        for macro in self.macros:
+            macro_dict = {}
+            macro_dict["name"] = macro.name
+            macro_dict["hex"] = macro.hex
+            macro_dict["text"] = macro.text
+            macro_dicts.append(macro_dict)
+        jsonDict["macros"] = macro_dicts
+        return jsonDict
+
+    def from_json(self, jsonDict):
+        for key in self.key_list:
+            self.set_member(key, jsonDict)
+
+        macro_dicts = jsonDict["macros"]
+        for mc, md in zip(self.macros, macro_dicts):
+            mc.name = md["name"]
+            mc.text = md["text"]
+            mc.hex = md["hex"]
+
+    def write(self):
+        with open(self.filename, "w") as outfile:
+            json.dump(self.to_json(), outfile, indent=4)
+
+    def load(self):
+        if not os.path.exists(self.filename):
+            self.write()
+
+        with open(self.filename, "r") as infile:
+            jsd = json.load(infile)
+
+        self.from_json(jsd)
+
+
+def print_ports() -> None:
+    ports = SerialPort.availablePorts()
+    print(f"{Ansi.BOLD}Port      Manufacturer   Product Id   Description{Ansi.RESET}")
+    for port in ports:
+        print(
+            f"{port.portName():<10}{port.manufacturer():<13}  {port.productIdentifier():>8}     {port.description()}"
+        )
+
+
+def replay_speed(arg: str) -> float:
+    """Argument type for replay speed factor, 0 or more"""
+    speed = float(arg)
+    if speed < 0:
+        raise argparse.ArgumentTypeError(f"speed must be 0 or more, not {arg}")
+    return speed
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line, options sending signals or listing ports exit"""
+    logging_format = "[%(levelname)s] %(lineno)4d %(funcName)-16s : %(message)s"
+
+    # options parsing
+    parser = argparse.ArgumentParser(
+        prog=App.NAME, add_help=True, description=App.DESCRIPTION
+    )
+    parser.add_argument(
+        "--version", action="version", version=f"%(prog)s {App.VERSION}"
+    )
+    parser.add_argument("--info", action="store_true", help="Information about script")
+    parser.add_argument(
+        "--suspend", action="store_true", help="Send signal to suspend port temporary"
+    )
+    parser.add_argument("--list", action="store_true", help="List serialports")
+    parser.add_argument("--debug", action="store_true", help="Activate debug printout")
+    parser.add_argument(
+        "--frame-rate",
+        action="store",
+        type=int,
+        dest="frame_rate",
+        default=App.FRAME_RATE,
+        help=f"Max terminal updates per second (default {App.FRAME_RATE})",
+    )
+    parser.add_argument(
+        "--decode-errors",
+        action="store",
+        choices=DecodeErrors.names(),
+        dest="decode_errors",
+        default="replace",
+        help="Received bytes that are not UTF-8 are replaced, escaped as hex or passed as Latin-1 (default replace)",
+    )
+    parser.add_argument(
+        "--capture",
+        action="store",
+        type=str,
+        default="",
+        help="Record data sent and received to capture file, appending if it exists",
+    )
+    parser.add_argument(
+        "--open-capture",
+        action="store",
+        type=str,
+        dest="open_capture",
+        default="",
+        help="Show data received in capture file as a read-only session",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store",
+        type=str,
+        default="",
+        help="Replay data received in capture file",
+    )
+    parser.add_argument(
+        "--replay-speed",
+        action="store",
+        type=replay_speed,
+        dest="replay_speed",
+        default=1.0,
+        help="Replay speed factor, 0 replays as fast as possible (default 1)",
+    )
+    parser.add_argument(
+        "--rx-thread",
+        action="store_true",
+        dest="rx_thread",
+        help="Read serial port in a separate thread, buffering data while the terminal is busy",
+    )
+    parser.add_argument(
+        "--paint",
+        action="store_true",
+        help="Use paint based terminal view drawing the cell grid directly",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store",
+        type=str,
+        default="",
+        help=f"Comma separated debug trace categories ({', '.join(Trace.categories)} or all), implies --debug",
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Run without GUI, writing data received on the profile's port to output",
+    )
+    parser.add_argument(
+        "--output",
+        action="store",
+        type=str,
+        default="-",
+        help="Headless output file, appended to, - is stdout (default -)",
+    )
+    parser.add_argument(
+        "--ext-program",
+        action="store",
+        type=str,
+        dest="ext_program",
+        help="Set external program to execute when signaled",
+        default="",
+    )
+    parser.add_argument(
+        "--exec-program",
+        action="store_true",
+        help="Send signal to initiate external program execution",
+    )
+
+    args = parser.parse_args()
+
+    if args.debug or args.trace != "":
+        logging.basicConfig(format=logging_format, level=logging.DEBUG)
+
+        # --debug alone traces everything, --trace selects categories
+        try:
+            Trace.enable(Trace.parse(args.trace or "all"))
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.list:
+        print_ports()
+        sys.exit()
+
+    if args.suspend:
+        with os.popen(
+            "ps aux | grep mpterm | grep -v -e 'grep' -e '--suspend'"
+        ) as file:
+            lines = file.readlines()
+
+        for line in lines:
+            pid = int(line.split()[1])
+            logging.debug(f"Sending suspend signal to process pid={pid}")
+            os.kill(pid, signal.SIGUSR1)
+
+        sys.exit()
+
+    if args.exec_program:
+        with os.popen(
+            "ps aux | grep mpterm | grep -v -e 'grep' -e '--exec-program'"
+        ) as file:
+            lines = file.readlines()
+
+        for line in lines:
+            pid = int(line.split()[1])
+            logging.debug(f"Sending suspend signal to process pid={pid}")
+            os.kill(pid, signal.SIGUSR2)
+
+        sys.exit()
+
+    return args
+
+
+def main() -> None:
+    pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Headless mpterm, for scripted logging without a display
+#
+# File:     mpheadless.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:
+# Date:     2026-10-18
+# License:  MIT
+# Python:   >= 3.0
+#
+# ----------------------------------------------------------------------------
+#
+# Opens the port of the saved profile and writes received data to stdout or
+# a file, in the display mode of the profile. Ascii and Terminal modes write
+# the text as received, escape sequences included, Hex and AsciiHex modes
+# write the hex formater output as plain text. SIGUSR1 (mpterm --suspend)
+# suspends the port and SIGUSR2 (mpterm --exec-program) runs the external
+# program, as in the GUI. The port is reopened when it reappears.
+#
+# PyQt5.QtWidgets is only loaded if the profile selects a plugin, plugins
+# create their widgets when loaded. They are never shown.
+#
+
+from __future__ import annotations
+import html
+import logging
+import os
+import re
+import signal
+import sys
+from typing import TextIO
+from PyQt5.QtCore import QByteArray, QCoreApplication, QObject, QProcess, QTimer
+from mpconfig import App, MpState, MpTerm, mpProfile, parse_args
+from serialport import (
+    ReadMode,
+    SerialPort,
+    data_bits,
+    stop_bits,
+    parities,
+    flow_controls,
+)
+from decoder import DecodeErrors, StreamDecoder
+from hexformater import HexFormater
+from macro import Macro
+from escape import Ansi
+from mptrace import Trace
+
+
+def html_to_text(html_text: str) -> str:
+    """Convert HTML from hex formater and plugins to plain text"""
+    text = re.sub(r"<br\s*/?>", "\n", html_text)
+    return html.unescape(re.sub(r"<[^>]*>", "", text))
+
+
+class HeadlessOutput:
+    """Stream written in place of the terminal widget, also given to plugins"""
+
+    def __init__(self, filename: str) -> None:
+        if filename == "-":
+            self.file: TextIO = sys.stdout
+        else:
+            self.file = open(filename, "a", encoding="utf-8")
+
+    def write(self, text: str) -> None:
+        self.file.write(text)
+        self.file.flush()
+
+    def append_ansi_text(self, text: str) -> None:
+        self.write(text)
+
+    def append_html_text(self, html_text: str) -> None:
+        self.write(html_to_text(html_text))
+
+    def scroll_down(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class HeadlessTerm(QObject):
+    """Receives data on the port of a profile and writes it to an output"""
+
+    STATE_INTERVAL = 200  # ms between state checks, lets signal handlers run
+
+    def __init__(self, args, prof: mpProfile, output: HeadlessOutput) -> None:
+        super().__init__()
+        self.prof = prof
+        self.output = output
+        self.state = MpState.DISCONNECTED
+        self.old_state = MpState.DISCONNECTED
+        self.open_failed = False  # Error of failing open already reported
+
+        self.port = f"/dev/{prof.port}"
+        self.serial_port = SerialPort()
+        self.serial_port.setPortName(self.port)
+        self.serial_port.setBaudRate(int(prof.bitrate))
+        self.serial_port.setDataBits(data_bits[prof.databits])
+        self.serial_port.setStopBits(stop_bits[prof.stopbits])
+        self.serial_port.setParity(parities[prof.parity])
+        self.serial_port.setFlowControl(flow_controls[prof.flowcontrol])
+        self.serial_port.set_read_buffer(prof.read_buffer, ReadMode[prof.read_mode])
+        self.serial_port.decoder.set_errors(DecodeErrors.from_name(args.decode_errors))
+        self.serial_port.set_threaded(args.rx_thread)
+        self.serial_port.readyRead.connect(self.read_data)
+
+        self.mode = MpTerm(prof.mode)
+        self.formater = HexFormater()
+        self.formater.set_mode(self.mode)
+        self.formater.set_columns(prof.columns)
+        if Macro.is_hex_string(prof.sync_string):
+            self.formater.set_sync_string(Macro.hexstring_to_list(prof.sync_string))
+
+        self.plugin = None
+        if prof.plugin not in ("", "None"):
+            self.plugin = self.load_plugin(prof.plugin)
+
+        if args.ext_program != "":
+            self.prof.ext_program = args.ext_program
+
+        self.process = QProcess()
+        self.process.setProcessChannelMode(QProcess.ProcessChannelMode.MergedChannels)
+        self.process.readyReadStandardOutput.connect(self.external_program_stdout)
+        self.process.finished.connect(self.external_program_finished)
+        self.process_decoder = StreamDecoder(self.serial_port.decoder.errors)
+
+        self.suspend_timer = QTimer()
+        self.suspend_timer.setSingleShot(True)
+        self.suspend_timer.setInterval(prof.suspend_timeout * 1000)
+        self.suspend_timer.timeout.connect(lambda: self.set_state(MpState.RECONNECTING))
+
+        self.timer = QTimer()
+        self.timer.setInterval(self.STATE_INTERVAL)
+        self.timer.timeout.connect(self.state_handler)
+        self.timer.start()
+
+        signal.signal(signal.SIGUSR1, self.signal_usr1)
+        signal.signal(signal.SIGUSR2, self.signal_usr2)
+
+        if args.capture != "":
+            self.serial_port.start_capture(args.capture)
+
+        self.set_state(MpState.RECONNECTING)
+        self.state_handler()
+
+    def load_plugin(self, name: str):
+        from mppluginframe import load_plugins
+
+        for plugin in load_plugins(self.serial_port, self.output):
+            if plugin.name == name:
+                logging.info(f"Using plugin {name}")
+                return plugin
+
+        logging.error(f"Plugin {name} not found")
+        return None
+
+    def set_state(self, new_state: MpState) -> None:
+        logging.debug(f"Set state: {new_state}")
+        if new_state in (MpState.DISCONNECTED, MpState.SUSPENDED):
+            self.serial_port.close()
+
+        if new_state == MpState.SUSPENDED:
+            self.suspend_timer.start()
+
+        self.old_state = self.state
+        self.state = new_state
+
+    def state_handler(self) -> None:
+        if self.state == MpState.CONNECTED and not (
+            self.serial_port.isOpen() and os.path.exists(self.port)
+        ):
+            logging.error(f"Port {self.port} no longer available.")
+            self.serial_port.close()
+            self.set_state(MpState.RECONNECTING)
+
+        if self.state == MpState.RECONNECTING:
+            self.serial_port.clear()
+            if self.serial_port.open():
+                logging.info(f"Opening port: {self.port} {self.serial_port.baudRate()}")
+                self.open_failed = False
+                self.set_state(MpState.CONNECTED)
+            elif not self.open_failed:
+                logging.error(
+                    f"Failed to open port {self.port}. {self.serial_port.error()}, retrying"
+                )
+                self.open_failed = True
+
+    def read_data(self) -> None:
+        data = self.serial_port.read()
+        data_str = self.serial_port.decode(data)
+
+        if Trace.RX:
+            logging.debug(f'Data received: {len(data)} "{Ansi.to_str(data_str)}"')
+
+        self.display_data(data, data_str)
+
+    def display_data(self, data: QByteArray, data_str: str) -> None:
+        if self.plugin is not None:
+            self.plugin.receive(data)
+        elif self.mode in (MpTerm.Hex, MpTerm.AsciiHex):
+            self.output.append_html_text(self.formater.format(data))
+        else:
+            self.output.append_ansi_text(data_str)
+
+    def signal_usr1(self, signum, frame) -> None:
+        """Signal handler for USR1, suspend port"""
+        logging.debug("USR1 signal received")
+        if self.state == MpState.CONNECTED:
+            logging.info(f"Suspending port for {self.prof.suspend_timeout} s.")
+            self.set_state(MpState.SUSPENDED)
+
+    def signal_usr2(self, signum, frame) -> None:
+        """Signal handler for USR2, run external program"""
+        logging.debug("USR2 signal received")
+        self.external_program_run()
+
+    def external_program_run(self) -> None:
+        if self.state in (MpState.SUSPENDED, MpState.EXTERNAL):
+            return
+
+        if self.prof.ext_program == "":
+            logging.error("No external program set")
+            return
+
+        self.serial_port.close()
+        self.set_state(MpState.EXTERNAL)
+        ext_prog = self.prof.ext_program.replace("__PORT__", self.port)
+        self.process_decoder.reset()
+        self.process.start(ext_prog)
+        logging.info(f"Running external program: {ext_prog}")
+
+    def external_program_stdout(self) -> None:
+        data = self.process.readAllStandardOutput()
+        self.output.append_ansi_text(self.process_decoder.decode(data))
+
+    def external_program_finished(self) -> None:
+        logging.info("External program finished executing")
+        if self.old_state in (MpState.CONNECTED, MpState.RECONNECTING):
+            self.set_state(MpState.RECONNECTING)
+        else:
+            self.set_state(MpState.DISCONNECTED)
+
+    def close(self) -> None:
+        self.serial_port.close()
+        self.serial_port.stop_capture()
+        self.output.close()
+
+
+def main() -> None:
+    args = parse_args()
+    if not args.debug and args.trace == "":
+        logging.basicConfig(format="[%(levelname)s] %(message)s", level=logging.INFO)
+
+    prof = mpProfile(filename=App.SETTINGS_FILE)
+    prof.load()
+
+    if prof.plugin not in ("", "None"):
+        from PyQt5.QtWidgets import QApplication  # Plugins create widgets
+
+        app = QApplication(sys.argv + ["-platform", "offscreen"])
+    else:
+        app = QCoreApplication(sys.argv)
+
+    # Quit the event loop on Ctrl-C and kill, so the output and capture is closed
+    signal.signal(signal.SIGINT, lambda signum, frame: app.quit())
+    signal.signal(signal.SIGTERM, lambda signum, frame: app.quit())
+
+    try:
+        output = HeadlessOutput(args.output)
+        term = HeadlessTerm(args, prof, output)
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f"Failed to start: {e}")
+        sys.exit(1)
+
+    res = app.exec_()
+    term.close()
+    sys.exit(res)
+
+
+if __name__ == "__main__":
+    main()
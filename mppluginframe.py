@@ -27,6 +27,38 @@ from PyQt5.QtWidgets import (
 )
 
 
+def load_plugins(serial_port, terminal) -> list[MpPlugin]:
+    """Load plugins from plugins directory, sending to serial_port and
+    printing to terminal"""
+
+    # Find plugin files in directory
+    no_list = ["mpplugin.py", "mpframe.py"]
+    plugin_files = []
+    for file_name in os.listdir(f"{os.path.dirname(__file__)}/plugins"):
+        if (
+            os.path.isfile(f"{os.path.dirname(__file__)}/plugins/{file_name}")
+            and file_name.startswith("__") is not True
+            and file_name not in no_list
+        ):
+            plugin_files.append(os.path.splitext(file_name)[0])
+
+    # Load plugins
+    plugins: list[MpPlugin] = []
+    for file_name in plugin_files:
+        plugin: MpPlugin = importlib.import_module(
+            f"plugins.{file_name}"
+        ).MpTermPlugin()
+        plugins.append(plugin)
+
+    # Initiate plugins
+    for plugin in plugins:
+        plugin._set_serial_port(serial_port)
+        plugin._set_terminal_widget(terminal)
+        logging.debug(str(plugin))
+
+    return plugins
+
+
 class MpPluginFrame(QWidget):
     def __init__(self, parent, serial_port, terminal):
         super().__init__(parent=parent)
@@ -86,31 +118,7 @@ class MpPluginFrame(QWidget):
         self.cur_plugin = plugin
 
     def load_plugins(self) -> None:
-
-        # Find plugin files in directory
-        no_list = ["mpplugin.py", "mpframe.py"]
-        plugin_files = []
-        for file_name in os.listdir(f"{os.path.dirname(__file__)}/plugins"):
-            if (
-                os.path.isfile(f"{os.path.dirname(__file__)}/plugins/{file_name}")
-                and file_name.startswith("__") is not True
-                and file_name not in no_list
-            ):
-                plugin_files.append(os.path.splitext(file_name)[0])
-
-        # Load plugins
-        self.plugins: list[MpPlugin] = []
-        for file_name in plugin_files:
-            plugin: MpPlugin = importlib.import_module(
-                f"plugins.{file_name}"
-            ).MpTermPlugin()
-            self.plugins.append(plugin)
-
-        # Initiate plugins
-        for plugin in self.plugins:
-            plugin._set_serial_port(self.serial_port)
-            plugin._set_terminal_widget(self.terminal)
-            logging.debug(str(plugin))
+        self.plugins: list[MpPlugin] = load_plugins(self.serial_port, self.terminal)
 
     def current_plugin(self) -> MpPlugin:
         return self.cb_plugins.currentData()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Trace switches for debug printouts in hot code paths
+#
+# File:     mptrace.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:
+# Date:     2026-10-18
+# License:  MIT
+# Python:   >= 3.0
+#
+# ----------------------------------------------------------------------------
+#
+# Trace points are written as
+#
+#   if Trace.CSI:
+#       logging.debug(f"...")
+#
+# A disabled trace point is one class attribute test, the message (and any
+# Ansi.to_str() call in it) is never built.
+#
+
+
+class Trace:
+    TOKENIZER = False  # Text and control tokens handled by the terminal
+    CSI = False  # Decoded escape sequences and CSI actions
+    SGR = False  # Select Graphic Rendition attributes
+    RX = False  # Data received from serial port or external program
+
+    categories = ["tokenizer", "csi", "sgr", "rx"]
+
+    @staticmethod
+    def parse(arg: str) -> list[str]:
+        """Parse comma separated list of categories, "all" selects every category"""
+        categories = []
+        for category in arg.lower().split(","):
+            category = category.strip()
+            if category == "":
+                continue
+            if category == "all":
+                categories.extend(Trace.categories)
+                continue
+            if category not in Trace.categories:
+                raise ValueError(
+                    f"Unknown trace category '{category}', use {', '.join(Trace.categories)} or all"
+                )
+            categories.append(category)
+        return categories
+
+    @staticmethod
+    def enable(categories: list[str]) -> None:
+        for category in categories:
+            setattr(Trace, category.upper(), True)
+
+    @staticmethod
+    def disable() -> None:
+        for category in Trace.categories:
+            setattr(Trace, category.upper(), False)
+
+    @staticmethod
+    def enabled() -> list[str]:
+        return [c for c in Trace.categories if getattr(Trace, c.upper()) is True]
+
+
+def main() -> None:
+    pass
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,7 @@ from typing import Any
 from mpplugin import MpPlugin, MpPluginWidget, MpPluginWidgetType
 from mpframe import MpFrame
 from escape import Ansi
+from enumlookup import EnumLookup
 
 # Variables ------------------------------------------------------------------
 
@@ -70,6 +71,12 @@ class AtorchReply(Enum):
     Unknown = 0xFFFF
 
 
+message_types = EnumLookup(AtorchMessageType, AtorchMessageType.NoMessage)
+device_types = EnumLookup(AtorchDeviceType, AtorchDeviceType.NoDevice)
+command_types = EnumLookup(AtorchCommandType, AtorchCommandType.NoCmd)
+reply_types = EnumLookup(AtorchReply, AtorchReply.Unknown)
+
+
 class AtorchFrame(MpFrame):
 
     def __init__(self, dev_type: AtorchDeviceType) -> None:
@@ -106,29 +113,16 @@ class AtorchFrame(MpFrame):
         return self.frame[-1]
 
     def message_type(self) -> AtorchMessageType:
-        for amt in AtorchMessageType:
-            if self.frame[2] == amt.value:
-                return amt
-        return AtorchMessageType.NoMessage
+        return message_types(self.frame[2])
 
     def device_type(self) -> AtorchDeviceType:
-        for adt in AtorchDeviceType:
-            if self.frame[3] == adt.value:
-                return adt
-        return AtorchDeviceType.NoDevice
+        return device_types(self.frame[3])
 
     def command_type(self) -> AtorchCommandType:
-        for act in AtorchCommandType:
-            if self.frame[4] == act.value:
-                return act
-        return AtorchCommandType.NoCmd
+        return command_types(self.frame[4])
 
     def reply_type(self) -> AtorchReply:
-        reply = self.hex_to_value(0x03, 2)
-        for ar in AtorchReply:
-            if reply == ar.value:
-                return ar
-        return AtorchReply.Unknown
+        return reply_types(self.hex_to_value(0x03, 2))
 
     def frame_to_str(self) -> str:
         return self.hex_str()
@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Paint based Ansi terminal view for Qt5
+#
+# File:     qterminalview.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:
+# Date:     2026-10-18
+# License:  MIT
+# Python:   >= 3.0
+#
+# ----------------------------------------------------------------------------
+#
+# QTerminalView draws the lines of TerminalState directly as a grid of
+# fixed pitch cells. Each line is rendered once to a pixmap, repainting
+# only blits cached pixmaps. Lines reported as changed by TerminalState
+# are re-rendered and only their rows are repainted.
+#
+
+# Imports --------------------------------------------------------------------
+
+import logging
+import sys
+from collections import OrderedDict
+
+from escape import Ansi
+from terminal import (
+    STYLES,
+    EscapeObj,
+    TerminalLine,
+    TerminalState,
+    TerminalUpdate,
+    TextFlag,
+)
+
+from PyQt5.QtCore import QPoint, QRect, Qt
+from PyQt5.QtGui import (
+    QColor,
+    QFont,
+    QFontMetrics,
+    QGuiApplication,
+    QKeySequence,
+    QMouseEvent,
+    QPainter,
+    QPaintEvent,
+    QPixmap,
+    QResizeEvent,
+    QTextCharFormat,
+    QTextCursor,
+    QTextDocument,
+    QTextDocumentFragment,
+    QTextFormat,
+    QWheelEvent,
+)
+from PyQt5.QtWidgets import QAbstractScrollArea, QApplication, QMenu
+
+# Code -----------------------------------------------------------------------
+
+
+def char_format_to_sgr(fmt: QTextCharFormat) -> str:
+    """Return SGR sequence giving the font attributes and colors of format"""
+    codes = []
+    if fmt.fontWeight() > QFont.Normal:
+        codes.append("1")
+    if fmt.fontItalic():
+        codes.append("3")
+    if fmt.fontUnderline():
+        codes.append("4")
+    if fmt.fontStrikeOut():
+        codes.append("9")
+    if fmt.fontOverline():
+        codes.append("53")
+    if fmt.hasProperty(QTextFormat.ForegroundBrush):
+        color = fmt.foreground().color()
+        codes.append(f"38;2;{color.red()};{color.green()};{color.blue()}")
+    if fmt.hasProperty(QTextFormat.BackgroundBrush):
+        color = fmt.background().color()
+        codes.append(f"48;2;{color.red()};{color.green()};{color.blue()}")
+
+    if len(codes) == 0:
+        return ""
+    return f"{Ansi.CSI}{';'.join(codes)}m"
+
+
+def html_to_ansi(html: str) -> str:
+    """Convert html to text with SGR sequences, so the styles of html from
+    plugins and the hex formater are kept by the cell grid"""
+    doc = QTextDocument()
+    QTextCursor(doc).insertFragment(QTextDocumentFragment.fromHtml(html))
+
+    lines = []
+    block = doc.begin()
+    while block.isValid():
+        line = []
+        it = block.begin()
+        while not it.atEnd():
+            fragment = it.fragment()
+            sgr = char_format_to_sgr(fragment.charFormat())
+            if sgr != "":
+                line.append(f"{sgr}{fragment.text()}{Ansi.RESET}")
+            else:
+                line.append(fragment.text())
+            it += 1
+        lines.append("".join(line))
+        block = block.next()
+
+    text = "\n".join(lines)
+    for separator in ("\u2028", "\u2029"):
+        text = text.replace(separator, "\n")
+    return text.replace("\xa0", " ").replace("\n", "\r\n")
+
+
+class CellStyleCache:
+    """Font and colors for styles, built once per style id and cursor"""
+
+    def __init__(
+        self, font: QFont, fg_color: QColor, bg_color: QColor, size: int = 1024
+    ) -> None:
+        self.font = font
+        self.default_fg = fg_color
+        self.default_bg = bg_color
+        self.size = size
+        self.clear()
+
+    def style(self, style_id: int, cursor: bool) -> tuple[QFont, QColor, QColor]:
+        if self.generation != STYLES.generation:
+            self.clear()  # Style ids renumbered
+        key = (style_id, cursor)
+        cell_style = self.styles.get(key)
+        if cell_style is not None:
+            self.styles.move_to_end(key)
+            return cell_style
+
+        cell_style = self.build(style_id, cursor)
+        self.styles[key] = cell_style
+        if len(self.styles) > self.size:
+            self.styles.popitem(last=False)  # Evict least recently used
+        return cell_style
+
+    def build(self, style_id: int, cursor: bool) -> tuple[QFont, QColor, QColor]:
+        style = STYLES[style_id]
+        fg_color = QColor(style.fg_color) if style.fg_color else self.default_fg
+        bg_color = QColor(style.bg_color) if style.bg_color else self.default_bg
+        if cursor != style.has(TextFlag.REVERSE):
+            fg_color, bg_color = bg_color, fg_color
+
+        font = QFont(self.font)
+        font.setBold(style.has(TextFlag.BOLD))
+        font.setItalic(style.has(TextFlag.ITALIC))
+
+        # Same precedence as text-decoration of the html renderer
+        if style.has(TextFlag.OVERLINE):
+            font.setOverline(True)
+        elif style.has(TextFlag.CROSSED):
+            font.setStrikeOut(True)
+        elif style.has(TextFlag.UNDERLINE):
+            font.setUnderline(True)
+        return font, fg_color, bg_color
+
+    def clear(self) -> None:
+        self.styles: OrderedDict[tuple[int, bool], tuple[QFont, QColor, QColor]] = (
+            OrderedDict()
+        )
+        self.generation = STYLES.generation
+
+
+class QTerminalView(QAbstractScrollArea):
+    """Terminal widget drawing the cell grid of TerminalState with paintEvent.
+
+    Has the same interface as QTerminalWidget so it can be used in its place.
+    """
+
+    def __init__(self, parent=None, rows: int = 24, columns: int = 80) -> None:
+        super().__init__(parent)
+
+        self.terminal_state = TerminalState(rows=rows, columns=columns)
+        self.responses: list[EscapeObj] = []  # Not yet returned to caller
+        self.max_lines = 100
+        self.follow = True  # Keep last line visible when lines are added
+
+        font = QFont("Monospace", 12)
+        font.setStyleHint(QFont.TypeWriter)
+        font.setFixedPitch(True)
+        self.cell_styles = CellStyleCache(font, QColor("#bbbbbb"), QColor("black"))
+        self.row_cache: dict[int, QPixmap] = {}  # Rendered lines by line id
+        self.main_row_cache: dict[int, QPixmap] = {}  # While alternate screen shown
+        self.alt_screen = False
+        self.setFont(font)
+
+        # Selection anchor and end as (line id, column index)
+        self.sel_anchor: tuple[int, int] = None
+        self.sel_end: tuple[int, int] = None
+
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.viewport().setCursor(Qt.IBeamCursor)
+        self.viewport().setAutoFillBackground(False)
+        self.verticalScrollBar().valueChanged.connect(self.scrolled)
+        self.update_scrollbar()
+
+    def setFont(self, font: QFont) -> None:
+        super().setFont(font)
+        metrics = QFontMetrics(font)
+        self.cell_width = metrics.horizontalAdvance("X")
+        self.cell_height = metrics.height()
+        self.ascent = metrics.ascent()
+        self.cell_styles.font = font
+        self.cell_styles.clear()
+        self.row_cache.clear()
+        self.viewport().update()
+
+    def setMaxLines(self, max_lines: int) -> None:
+        """Set number of lines kept, including the visible screen"""
+        self.max_lines = max_lines
+        self.terminal_state.scrollback = max(max_lines - self.terminal_state.rows, 0)
+        self.clear()
+
+    def clear(self) -> None:
+        self.terminal_state.reset()
+        self.responses.clear()
+        self.row_cache.clear()
+        self.main_row_cache.clear()
+        self.alt_screen = False
+        self.sel_anchor = None
+        self.sel_end = None
+        self.update_scrollbar()
+        self.viewport().update()
+
+    # Model ------------------------------------------------------------------
+
+    def line_count(self) -> int:
+        return len(self.terminal_state.lines)
+
+    def line_at(self, index: int) -> TerminalLine:
+        """Return line at index, 0 is the oldest line"""
+        return self.terminal_state.lines[self.line_count() - 1 - index]
+
+    def index_of(self, line_id: int) -> int:
+        """Return index of line with id, line ids are consecutive in the ring"""
+        return self.line_count() - 1 - (self.terminal_state.lines[0].id - line_id)
+
+    def visible_rows(self) -> int:
+        return max(self.viewport().height() // self.cell_height, 1)
+
+    def update_scrollbar(self) -> None:
+        vsb = self.verticalScrollBar()
+        maximum = max(self.line_count() - self.visible_rows(), 0)
+        vsb.setRange(0, maximum)
+        vsb.setPageStep(self.visible_rows())
+        if self.follow:
+            vsb.setValue(maximum)
+
+    def scrolled(self, value: int) -> None:
+        self.follow = value == self.verticalScrollBar().maximum()
+        self.viewport().update()
+
+    def append_ansi_text(self, data: str) -> EscapeObj:
+        """Append ANSI text to the terminal. Return EscapeObj if escape sequence detected."""
+        if type(data) is str:
+            update = self.terminal_state.update(data)
+            self.responses.extend(update.responses)
+            self.render(update)
+
+        if len(self.responses) > 0:
+            return self.responses.pop(0)
+        return None
+
+    def append_html_text(self, html: str) -> None:
+        """Append html, its styles converted to SGR sequences for the grid"""
+        update = self.terminal_state.update(html_to_ansi(html))
+        self.render(update)  # No responses to html text
+
+    def scroll_down(self) -> None:
+        """Scroll down to the last line."""
+        vsb = self.verticalScrollBar()
+        vsb.setValue(vsb.maximum())
+
+    def set_terminal_size(self, rows: int, columns: int) -> None:
+        """Resize the terminal screen, lines in scrollback are kept"""
+        rows = min(rows, self.max_lines)
+        self.terminal_state.scrollback = self.max_lines - rows
+        self.terminal_state.resize(rows, columns)
+        self.append_ansi_text("")  # Redraw screen
+        self.update_scrollbar()
+
+    # Rendering --------------------------------------------------------------
+
+    def render(self, update: TerminalUpdate) -> None:
+        """Drop rendered changed lines and schedule repaint of their rows"""
+        if update.alt_screen != self.alt_screen:
+            self.set_alt_screen(update.alt_screen)
+
+        for top_id, bottom_id, n in update.scrolls:
+            self.scroll_lines(top_id, bottom_id, n)
+
+        for line in update.lines:
+            self.row_cache.pop(line.id, None)
+
+        if update.scroll > 0:
+            self.update_scrollbar()
+            if self.follow:  # Everything moved up, rows are blitted from cache
+                self.viewport().update()
+                return
+
+        first = self.verticalScrollBar().value()
+        rows = self.visible_rows()
+        width = self.viewport().width()
+        for line in update.lines:
+            row = self.index_of(line.id) - first
+            if 0 <= row <= rows:
+                self.viewport().update(
+                    QRect(0, row * self.cell_height, width, self.cell_height)
+                )
+
+    def set_alt_screen(self, alt: bool) -> None:
+        """Swap rendered lines of main and alternate screen. Line ids of the
+        alternate screen are reused by the main screen after exit."""
+        self.alt_screen = alt
+        self.row_cache, self.main_row_cache = self.main_row_cache, self.row_cache
+        if alt:
+            self.row_cache.clear()
+        self.sel_anchor = None
+        self.sel_end = None
+        self.update_scrollbar()
+        self.viewport().update()
+
+    def scroll_lines(self, top_id: int, bottom_id: int, n: int) -> None:
+        """Move rendered lines of scrolled region up n lines, down if n is
+        negative, and schedule repaint of the region"""
+        moved = {}
+        for line_id in range(top_id, bottom_id + 1):
+            pixmap = self.row_cache.pop(line_id, None)
+            if pixmap is not None and top_id <= line_id - n <= bottom_id:
+                moved[line_id - n] = pixmap
+        self.row_cache.update(moved)
+
+        first = self.verticalScrollBar().value()
+        top = self.index_of(top_id) - first
+        bottom = self.index_of(bottom_id) - first
+        self.viewport().update(
+            QRect(
+                0,
+                top * self.cell_height,
+                self.viewport().width(),
+                (bottom - top + 1) * self.cell_height,
+            )
+        )
+
+    def render_line(self, line: TerminalLine) -> QPixmap:
+        """Render line to pixmap, characters are drawn at their cell position"""
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(
+            int(max(len(line), 1) * self.cell_width * ratio),
+            int(self.cell_height * ratio),
+        )
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(self.cell_styles.default_bg)
+
+        painter = QPainter(pixmap)
+        cursor_idx = -1 if line.cursor is None else line.cursor.column - 1
+        for start, stop in line.runs(0, len(line)):
+            font, fg_color, bg_color = self.cell_styles.style(
+                line.styles[start], start == cursor_idx
+            )
+            x = start * self.cell_width
+            painter.fillRect(
+                x, 0, (stop - start) * self.cell_width, self.cell_height, bg_color
+            )
+            painter.setFont(font)
+            painter.setPen(fg_color)
+            text = "".join(line.chars[start:stop])
+            if text.isascii():
+                painter.drawText(x, self.ascent, text)
+            else:  # Wide glyphs would push following characters out of their cells
+                for i, ch in enumerate(text):
+                    painter.drawText(x + i * self.cell_width, self.ascent, ch)
+        painter.end()
+        return pixmap
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        painter = QPainter(self.viewport())
+        painter.fillRect(event.rect(), self.cell_styles.default_bg)
+
+        first = self.verticalScrollBar().value()
+        first_row = event.rect().top() // self.cell_height
+        last_row = event.rect().bottom() // self.cell_height
+        visible = set()
+        for row in range(first_row, last_row + 1):
+            index = first + row
+            if index >= self.line_count():
+                break
+            line = self.line_at(index)
+            visible.add(line.id)
+            pixmap = self.row_cache.get(line.id)
+            if pixmap is None:
+                pixmap = self.render_line(line)
+                self.row_cache[line.id] = pixmap
+            painter.drawPixmap(0, row * self.cell_height, pixmap)
+
+        self.paint_selection(painter, first, first_row, last_row)
+        painter.end()
+
+        # Keep cache bounded to a few screens of lines
+        if len(self.row_cache) > 4 * self.visible_rows():
+            for line_id in [i for i in self.row_cache if i not in visible]:
+                del self.row_cache[line_id]
+
+    def paint_selection(
+        self, painter: QPainter, first: int, first_row: int, last_row: int
+    ) -> None:
+        selection = self.selection()
+        if selection is None:
+            return
+
+        (start_index, start_col), (end_index, end_col) = selection
+        color = QColor(self.palette().highlight().color())
+        color.setAlpha(128)
+        for row in range(first_row, last_row + 1):
+            index = first + row
+            if index < start_index or index > end_index:
+                continue
+            col_from = start_col if index == start_index else 0
+            col_to = end_col if index == end_index else len(self.line_at(index))
+            painter.fillRect(
+                col_from * self.cell_width,
+                row * self.cell_height,
+                (col_to - col_from) * self.cell_width,
+                self.cell_height,
+                color,
+            )
+
+    def resizeEvent(self, event: QResizeEvent) -> None:
+        super().resizeEvent(event)
+        self.update_scrollbar()
+
+    def wheelEvent(self, event: QWheelEvent) -> None:
+        vsb = self.verticalScrollBar()
+        vsb.setValue(vsb.value() - event.angleDelta().y() // 40)
+
+    # Selection --------------------------------------------------------------
+
+    def cell_at(self, pos: QPoint) -> tuple[int, int]:
+        """Return (line id, column index) at viewport position"""
+        index = self.verticalScrollBar().value() + max(pos.y(), 0) // self.cell_height
+        index = min(index, self.line_count() - 1)
+        column = max(round(pos.x() / self.cell_width), 0)
+        return self.line_at(index).id, column
+
+    def selection(self) -> tuple[tuple[int, int], tuple[int, int]]:
+        """Return ordered selection as ((index, column), (index, column))"""
+        if self.sel_anchor is None or self.sel_end is None:
+            return None
+        oldest = self.terminal_state.lines[-1].id
+        if self.sel_anchor[0] < oldest or self.sel_end[0] < oldest:
+            return None  # Selected lines has left the scrollback
+        start = (self.index_of(self.sel_anchor[0]), self.sel_anchor[1])
+        end = (self.index_of(self.sel_end[0]), self.sel_end[1])
+        if start == end:
+            return None
+        return (start, end) if start < end else (end, start)
+
+    def selected_text(self) -> str:
+        selection = self.selection()
+        if selection is None:
+            return ""
+
+        (start_index, start_col), (end_index, end_col) = selection
+        text = []
+        for index in range(start_index, end_index + 1):
+            line = self.line_at(index).text
+            col_from = start_col if index == start_index else 0
+            col_to = end_col if index == end_index else len(line)
+            text.append(line[col_from:col_to].rstrip())
+        return "\n".join(text)
+
+    def copy(self) -> None:
+        """Copy selected text to clipboard"""
+        text = self.selected_text()
+        if text != "":
+            QGuiApplication.clipboard().setText(text)
+
+    def selectAll(self) -> None:
+        self.sel_anchor = (self.line_at(0).id, 0)
+        last = self.line_at(self.line_count() - 1)
+        self.sel_end = (last.id, len(last))
+        self.viewport().update()
+
+    def mousePressEvent(self, event: QMouseEvent) -> None:
+        if event.button() == Qt.LeftButton:
+            self.sel_anchor = self.cell_at(event.pos())
+            self.sel_end = None
+            self.viewport().update()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event: QMouseEvent) -> None:
+        if event.buttons() & Qt.LeftButton and self.sel_anchor is not None:
+            self.sel_end = self.cell_at(event.pos())
+            self.viewport().update()
+
+    def mouseReleaseEvent(self, event: QMouseEvent) -> None:
+        clipboard = QGuiApplication.clipboard()
+        if event.button() == Qt.LeftButton and clipboard.supportsSelection():
+            clipboard.setText(self.selected_text(), clipboard.Selection)
+
+    def contextMenuEvent(self, event) -> None:
+        menu = QMenu(self)
+        action_copy = menu.addAction("&Copy", self.copy)
+        action_copy.setShortcut(QKeySequence.Copy)
+        action_copy.setEnabled(self.selection() is not None)
+        menu.addSeparator()
+        action_all = menu.addAction("Select All", self.selectAll)
+        action_all.setShortcut(QKeySequence.SelectAll)
+        menu.exec_(event.globalPos())
+
+
+def main() -> None:
+    logging.basicConfig(
+        format="[%(levelname)s] Line: %(lineno)d %(message)s", level=logging.DEBUG
+    )
+    app = QApplication(sys.argv)
+    view = QTerminalView()
+    view.setMaxLines(500)
+    view.resize(900, 600)
+    view.append_html_text("QTerminalView <b>test</b><br><br>")
+    view.append_ansi_text(Ansi.test() + "\n" + Ansi.color_test())
+    view.show()
+    sys.exit(app.exec_())
+
+
+if __name__ == "__main__":
+    main()
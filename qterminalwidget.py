@@ -17,14 +17,28 @@
 
 import logging
 import sys
+from collections import OrderedDict
+from enum import Enum
 from typing import Callable
 
 from escape import Ansi, Ascii
-from terminal import EscapeObj, TerminalState, TerminalLine
+from terminal import (
+    STYLES,
+    EscapeObj,
+    TerminalState,
+    TerminalLine,
+    TerminalUpdate,
+    TextFlag,
+)
 
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import (
+    QColor,
+    QFont,
+    QTextBlockFormat,
+    QTextCharFormat,
     QTextCursor,
+    QTextDocument,
     QKeyEvent,
     QKeyEvent,
     QCloseEvent,
@@ -32,6 +46,7 @@ from PyQt5.QtGui import (
 from PyQt5.QtWidgets import (
     QApplication,
     QMainWindow,
+    QPlainTextDocumentLayout,
     QPlainTextEdit,
     QVBoxLayout,
     QHBoxLayout,
@@ -102,16 +117,93 @@ def get_key(key: QKeyEvent) -> str:
     return key.text()
 
 
+class TerminalRenderer(Enum):
+    HTML = 0  # Lines converted to html and inserted with insertHtml
+    FORMAT = 1  # Style runs inserted as text with cached QTextCharFormat
+
+
+class CharFormatCache:
+    """QTextCharFormat for styles, built once per style id and cursor.
+    Gives the same visual result as the html span tags of TerminalLine."""
+
+    def __init__(self, size: int = 1024) -> None:
+        self.size = size
+        self.clear()
+
+    def clear(self) -> None:
+        self.formats: OrderedDict[tuple[int, bool], QTextCharFormat] = OrderedDict()
+        self.generation = STYLES.generation
+
+    def format(self, style_id: int, cursor: bool) -> QTextCharFormat:
+        if self.generation != STYLES.generation:
+            self.clear()  # Style ids renumbered
+        key = (style_id, cursor)
+        fmt = self.formats.get(key)
+        if fmt is not None:
+            self.formats.move_to_end(key)
+            return fmt
+
+        style = STYLES[style_id]
+        fmt = self.build(style, cursor != style.has(TextFlag.REVERSE))
+        self.formats[key] = fmt
+        if len(self.formats) > self.size:
+            self.formats.popitem(last=False)  # Evict least recently used
+        return fmt
+
+    def build(self, style, reversed: bool) -> QTextCharFormat:
+        if reversed:
+            fg_color = style.bg_color
+            bg_color = style.fg_color
+        else:
+            fg_color = style.fg_color
+            bg_color = style.bg_color
+
+        fmt = QTextCharFormat()
+        fmt.setFontPointSize(12)
+        if QColor.isValidColor(fg_color):
+            fmt.setForeground(QColor(fg_color))
+        if QColor.isValidColor(bg_color):
+            fmt.setBackground(QColor(bg_color))
+        if style.has(TextFlag.BOLD):
+            fmt.setFontWeight(QFont.Bold)
+        if style.has(TextFlag.ITALIC):
+            fmt.setFontItalic(True)
+
+        # As for css text-decoration in the html spans, the last one wins
+        if style.has(TextFlag.OVERLINE):
+            fmt.setFontOverline(True)
+        elif style.has(TextFlag.CROSSED):
+            fmt.setFontStrikeOut(True)
+        elif style.has(TextFlag.UNDERLINE):
+            fmt.setFontUnderline(True)
+        return fmt
+
+
+# Spaces are inserted as &nbsp; by the html renderer
+NBSP = str.maketrans(" ", "\xa0")
+
+
 class QTerminalWidget(QPlainTextEdit):
     """QTerminalWidget implements a limited ANSI terminal into a QPlainTextEdit widget."""
 
-    def __init__(self, parent=None, init="") -> None:
+    def __init__(
+        self, parent=None, init="", renderer: TerminalRenderer = TerminalRenderer.HTML
+    ) -> None:
         super().__init__(parent)
 
+        self.renderer = renderer
+        self.formats = CharFormatCache()
+        self.line_format = QTextBlockFormat()  # As <div> of TerminalLine html
+        self.line_format.setLineHeight(30, QTextBlockFormat.MinimumHeight)
+        # Scrollback is kept in the main document while the alternate screen is shown
+        self.main_document = self.new_document()
+        self.alt_document = self.new_document()
+        self.main_last_id = 0
+        self.setDocument(self.main_document)
         self.cur = QTextCursor(self.document())
         self.terminal_state = TerminalState(rows=24, columns=80)
         # self.terminal_state = TerminalState(rows=50, columns=120)
-        self.data_list = []
+        self.responses: list[EscapeObj] = []  # Not yet returned to caller
         self.setCursorWidth(2)
         self.ensureCursorVisible()
         self.setReadOnly(True)
@@ -140,14 +232,47 @@ class QTerminalWidget(QPlainTextEdit):
         )
 
         self.max_lines = 100
-        self.last_id = 0
+        self.setMaximumBlockCount(self.max_lines)
 
     def setMaxLines(self, max_lines) -> None:
-        self.max_lines = max_lines
+        """Set number of lines kept. TerminalState keeps the same number of
+        lines, so every line id in the document is still in its ring."""
+        self.max_lines = max(max_lines, self.terminal_state.rows)
+        self.terminal_state.scrollback = self.max_lines - self.terminal_state.rows
+        self.setMaximumBlockCount(self.max_lines)
+        self.clear()
+
+    def new_document(self) -> QTextDocument:
+        """Return empty document owned by the widget, kept when swapped out"""
+        document = QTextDocument(self)
+        document.setDocumentLayout(QPlainTextDocumentLayout(document))
+        return document
+
+    def set_alt_screen(self, alt: bool) -> None:
+        """Show the alternate screen document or the main document again.
+        The alternate screen is a fixed size view without scrollback, the
+        main document is left as it is meanwhile."""
+        if alt == (self.document() is self.alt_document):
+            return
+
+        if alt:
+            self.main_last_id = self.last_id
+            self.alt_document.clear()
+            self.alt_document.setDefaultFont(self.main_document.defaultFont())
+            self.alt_document.setMaximumBlockCount(self.terminal_state.rows + 1)
+            self.last_id = self.terminal_state.lines.row(1).id - 1
+            self.setDocument(self.alt_document)
+        else:
+            self.last_id = self.main_last_id
+            self.setDocument(self.main_document)
+        self.cur = QTextCursor(self.document())
 
     def clear(self) -> None:
+        self.set_alt_screen(False)
         super().clear()
         self.terminal_state.reset()
+        # The empty document holds the line above the top row
+        self.last_id = self.terminal_state.lines.row(1).id - 1
         self.moveCursor(QTextCursor.End)
 
     def printpos(self, newPos: QTextCursor.MoveOperation) -> None:
@@ -161,24 +286,20 @@ class QTerminalWidget(QPlainTextEdit):
     def move(self, direction: QTextCursor, anchor: QTextCursor, steps: int = 1) -> None:
         self.cur.movePosition(direction, anchor, n=steps)
 
-    def remove_rows_alt(self, lines) -> None:
+    def remove_rows(self, lines) -> None:
+        """Remove first lines of the document in one edit"""
         logging.debug(f"Removing {lines} lines")
-        cursor = self.textCursor()  # QTextCursor(self.document())
-
-        for _ in range(lines):
-            cursor.movePosition(QTextCursor.Start, QTextCursor.MoveAnchor)
-            cursor.select(QTextCursor.LineUnderCursor)
-            cursor.removeSelectedText()
-            cursor.deleteChar()
-
-        self.setTextCursor(cursor)
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.NextBlock, QTextCursor.KeepAnchor, lines)
+        cursor.removeSelectedText()
 
     def limit_lines(self) -> None:
-        """Limit the number of lines in the terminal widget."""
+        """Limit the number of lines in the terminal widget. Lines of appended
+        html share one block and are not limited by the maximum block count."""
         lines = self.document().lineCount()
         # logging.debug(f"Lines: {lines}  Maxlines: {self.max_lines}")
         if lines > self.max_lines:
-            self.remove_rows_alt(lines - self.max_lines)
+            self.remove_rows(lines - self.max_lines)
 
     def insert_html(self, html: str) -> None:
         self.cur.insertHtml(html)
@@ -189,47 +310,136 @@ class QTerminalWidget(QPlainTextEdit):
         self.insert(html)
         self.limit_lines()
 
+    def replace_dirty_span(self, line: TerminalLine) -> bool:
+        """Re-render only the changed cells of a line already in the document.
+        The cursor must be at start of the line. Return False, with the cursor
+        left at start of the line, if the whole line must be replaced."""
+        if line.is_fully_dirty():
+            return False
+
+        line_start = self.cur.position()
+        length = self.cur.block().length() - 1  # Without block separator
+        if length != len(line):  # Line length changed or wide characters
+            return False
+
+        start, stop = line.dirty_span()
+        if start < stop:
+            self.cur.setPosition(line_start + start, QTextCursor.MoveAnchor)
+            self.cur.setPosition(line_start + stop, QTextCursor.KeepAnchor)
+            self.insert_span(line, start, stop)
+        return True
+
+    def insert_span(self, line: TerminalLine, start: int, stop: int) -> None:
+        """Replace selection with cells in range start to stop"""
+        if self.renderer == TerminalRenderer.HTML:
+            self.cur.insertHtml("".join(line.span_to_html(start, stop)))
+            return
+
+        cursor_idx = -1 if line.cursor is None else line.cursor.column - 1
+        self.cur.beginEditBlock()  # Layout once for all runs
+        for run_start, run_stop in line.runs(start, stop):
+            text = "".join(line.chars[run_start:run_stop]).translate(NBSP)
+            fmt = self.formats.format(line.styles[run_start], run_start == cursor_idx)
+            self.cur.insertText(text, fmt)
+        self.cur.endEditBlock()
+
+    def insert_line(self, line: TerminalLine) -> None:
+        """Replace selection with the whole line"""
+        if self.renderer == TerminalRenderer.HTML:
+            self.cur.insertHtml(line.line_to_html())
+            return
+
+        self.cur.removeSelectedText()
+        if self.cur.atStart():  # insertHtml sets the <div> format of first block
+            self.cur.mergeBlockFormat(self.line_format)
+        self.insert_span(line, 0, len(line))
+
     def append_ansi_text(self, data: str) -> None:
         """Append ANSI text to the terminal. Return EscapeObj if escape sequence detected."""
 
         if type(data) is str:
-            lines = self.terminal_state.update(data)
-            self.data_list.extend(lines)
-
-        for i in range(len(self.data_list)):
-            obj = self.data_list.pop(0)
-            if type(obj) is TerminalLine:
-                if obj.id > self.last_id:  # a new line detected
-                    self.last_id = obj.id
-                    self.move(QTextCursor.End, QTextCursor.MoveAnchor)
-                    self.cur.insertHtml("<br>")
-
-                if obj.id == self.last_id:  # last row
-                    self.move(QTextCursor.End, QTextCursor.MoveAnchor)
-                    self.move(QTextCursor.StartOfLine, QTextCursor.KeepAnchor)
-
-                if obj.id < self.last_id:
-                    self.move(QTextCursor.End, QTextCursor.MoveAnchor)
-                    self.move(
-                        QTextCursor.Up, QTextCursor.MoveAnchor, self.last_id - obj.id
-                    )
-                    self.move(QTextCursor.StartOfLine, QTextCursor.MoveAnchor)
-                    self.move(QTextCursor.EndOfLine, QTextCursor.KeepAnchor)
-
-                self.cur.insertHtml(obj.line_to_html())
-                # print(f"HTML id={obj.id}")
-
-            if type(obj) is EscapeObj:
-                return obj
+            update = self.terminal_state.update(data)
+            self.responses.extend(update.responses)
+            self.render(update)
 
-        self.limit_lines()
+        if len(self.responses) > 0:
+            return self.responses.pop(0)
         return None
 
+    def move_to_line(self, line_id: int, offset: int = 0) -> None:
+        """Move cursor to start of line with id, offset lines are inserted below it.
+        Lines are blocks, found directly whether they are wrapped or not."""
+        back = max(self.last_id + offset - line_id, 0)
+        block_count = self.document().blockCount()
+        block = self.document().findBlockByNumber(max(block_count - 1 - back, 0))
+        self.cur = QTextCursor(block)
+
+    def add_lines(self, line_id: int) -> None:
+        """Add lines below the last one in the document up to line id in one edit"""
+        new_lines = line_id - self.last_id
+        if new_lines > 0:
+            self.move(QTextCursor.End, QTextCursor.MoveAnchor)
+            self.cur.insertText("\n" * new_lines)  # Oldest blocks are dropped
+            self.last_id += new_lines
+
+    def scroll_lines(self, top_id: int, bottom_id: int, n: int) -> None:
+        """Scroll lines top_id to bottom_id up n lines, down if n is negative.
+        Moved lines are kept as they are, blank lines are inserted at the
+        other end of the region and rendered as changed lines."""
+        self.add_lines(bottom_id)
+        k = min(abs(n), bottom_id - top_id + 1)
+
+        # Blank lines are inserted before removing, don't drop blocks meanwhile
+        max_blocks = self.maximumBlockCount()
+        self.setMaximumBlockCount(0)
+        if n > 0:
+            self.move_to_line(bottom_id)
+            self.move(QTextCursor.EndOfBlock, QTextCursor.MoveAnchor)
+            self.cur.insertText("\n" * k)
+            self.move_to_line(top_id, k)
+            self.move(QTextCursor.NextBlock, QTextCursor.KeepAnchor, k)
+        else:
+            self.move_to_line(top_id)
+            self.cur.insertText("\n" * k)
+            self.move_to_line(bottom_id - k)
+            self.move(QTextCursor.EndOfBlock, QTextCursor.MoveAnchor)
+            self.move(QTextCursor.NextBlock, QTextCursor.KeepAnchor, k)
+            self.move(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
+        self.cur.removeSelectedText()
+        self.setMaximumBlockCount(max_blocks)
+
+    def render(self, update: TerminalUpdate) -> None:
+        """Apply changes of one terminal update to the document"""
+        self.set_alt_screen(update.alt_screen)
+
+        for top_id, bottom_id, n in update.scrolls:
+            self.scroll_lines(top_id, bottom_id, n)
+
+        if len(update.lines) == 0:
+            return
+
+        self.add_lines(max(line.id for line in update.lines))
+
+        for line in update.lines:
+            self.move_to_line(line.id)
+            if self.replace_dirty_span(line):
+                continue
+            self.move(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
+            self.insert_line(line)
+
     def scroll_down(self) -> None:
         """Scroll down to the last line."""
         vsb = self.verticalScrollBar()
         vsb.setValue(vsb.maximum())
 
+    def set_terminal_size(self, rows: int, columns: int) -> None:
+        """Resize the terminal screen, lines already in the document are kept"""
+        rows = min(rows, self.max_lines)
+        self.terminal_state.scrollback = self.max_lines - rows
+        self.terminal_state.resize(rows, columns)
+        self.alt_document.setMaximumBlockCount(rows + 1)
+        self.append_ansi_text("")  # Redraw screen
+
 
 space_test_string = f"""{Ansi.BOLD}1234{Ansi.RESET}5678\n"""
 
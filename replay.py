@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Replay of data received in a capture file
+#
+# File:     replay.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:
+# Date:     2026-10-18
+# License:  MIT
+# Python:   >= 3.0
+#
+# ----------------------------------------------------------------------------
+#
+# Received data is sent in the chunks it was read from the port, with the
+# original timing, N times faster or as fast as the receiver keeps up. Time
+# between recordings appended to the same file is not replayed.
+#
+
+from __future__ import annotations
+import time
+from PyQt5.QtCore import QByteArray, QObject, QTimer, pyqtSignal
+from capture import Direction, read_capture
+
+
+class CaptureReplay(QObject):
+    """Sends data received in a capture file as data_ready signals"""
+
+    data_ready = pyqtSignal(QByteArray)
+    finished = pyqtSignal()
+
+    MAX_SPEED = 0.0  # Speed for replay as fast as possible
+    MAX_CHUNK = 1 << 16  # Max bytes per signal, due chunks are joined
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.chunks: list[tuple[int, bytes]] = []  # Replay time in ns, data
+        self.pos = 0
+        self.speed = 1.0
+        self.start_time = 0  # Monotonic ns when replay started
+        self.sent = 0  # Bytes sent
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.send_due)
+
+    def start(self, filename: str, speed: float = 1.0) -> None:
+        """Start replay of capture file at speed times the original speed, or
+        as fast as possible if speed is MAX_SPEED.
+
+        Raises:
+            OSError: File could not be read
+            ValueError: Speed is negative, file is not a capture file or has
+                no received data
+        """
+        if speed < 0:
+            raise ValueError(f"Replay speed must be 0 or more, not {speed}")
+
+        self.stop()
+        self.chunks = []
+        offset = 0  # Replay time of current recording
+        last = None  # Capture time of last record in current recording
+        for record in read_capture(filename):
+            if record.direction == Direction.SESSION:
+                last = None
+            elif record.direction == Direction.RX:
+                if last is not None:
+                    offset += record.time - last
+                last = record.time
+                self.chunks.append((offset, record.data))
+
+        if len(self.chunks) == 0:
+            raise ValueError(f"No received data in {filename}")
+
+        self.pos = 0
+        self.sent = 0
+        self.speed = speed
+        self.start_time = time.monotonic_ns()
+        self.timer.start(0)
+
+    def stop(self) -> None:
+        self.timer.stop()
+        self.chunks = []
+        self.pos = 0
+
+    def is_active(self) -> bool:
+        return len(self.chunks) > 0
+
+    def size(self) -> int:
+        """Bytes to be replayed in total"""
+        return sum(len(data) for _, data in self.chunks)
+
+    def elapsed(self) -> float:
+        """Seconds since replay started"""
+        return (time.monotonic_ns() - self.start_time) / 1e9
+
+    def due(self, replay_time: int) -> int:
+        """Return monotonic ns when chunk at replay time is due"""
+        if self.speed == self.MAX_SPEED:
+            return self.start_time
+        return self.start_time + int(replay_time / self.speed)
+
+    def send_due(self) -> None:
+        now = time.monotonic_ns()
+        data = bytearray()
+        while (
+            self.pos < len(self.chunks)
+            and len(data) < self.MAX_CHUNK
+            and self.due(self.chunks[self.pos][0]) <= now
+        ):
+            data += self.chunks[self.pos][1]
+            self.pos += 1
+
+        if len(data) > 0:
+            self.sent += len(data)
+            self.data_ready.emit(QByteArray(bytes(data)))
+
+        if not self.is_active():  # Stopped by receiver
+            return
+
+        if self.pos == len(self.chunks):
+            self.stop()
+            self.finished.emit()
+            return
+
+        # Let the event loop run between chunks, also at max speed
+        wait = self.due(self.chunks[self.pos][0]) - time.monotonic_ns()
+        self.timer.start(max(0, wait // 1000000))
+
+
+def main() -> None:
+    pass
+
+
+if __name__ == "__main__":
+    main()
@@ -13,8 +13,20 @@
 #
 # ----------------------------------------------------------------------------
 import logging
-from PyQt5.QtCore import QIODevice
+import os
+import select
+from enum import Enum
+from PyQt5.QtCore import (
+    QByteArray,
+    QIODevice,
+    QSocketNotifier,
+    QThread,
+    QTimer,
+    pyqtSignal,
+)
 from PyQt5.QtSerialPort import QSerialPort, QSerialPortInfo
+from capture import CaptureWriter, Direction
+from decoder import StreamDecoder
 
 
 # class State(enum.Enum):
@@ -52,12 +64,206 @@ bitrates = [
     256000,
 ]
 
+# Port settings by the names shown in the GUI and saved in profiles
+data_bits = {
+    "5": QSerialPort.Data5,
+    "6": QSerialPort.Data6,
+    "7": QSerialPort.Data7,
+    "8": QSerialPort.Data8,
+}
+
+stop_bits = {
+    "1": QSerialPort.OneStop,
+    "1.5": QSerialPort.OneAndHalfStop,
+    "2": QSerialPort.TwoStop,
+}
+
+parities = {
+    "None": QSerialPort.NoParity,
+    "Odd": QSerialPort.OddParity,
+    "Even": QSerialPort.EvenParity,
+}
+
+flow_controls = {
+    "None": QSerialPort.NoFlowControl,
+    "Hardware": QSerialPort.HardwareControl,
+    "Software": QSerialPort.SoftwareControl,
+}
+
+
+class ReadMode(Enum):
+    FIXED = 0  # Read buffer of configured size
+    ADAPTIVE = 1  # Read buffer grows under load and shrinks when interactive
+
+
+class ReadSizer:
+    """Read chunk size following the traffic.
+
+    A read filling the chunk means data arrives faster than it is taken, the
+    chunk is doubled up to maximum. After SHRINK_AFTER reads below a quarter
+    of the chunk, as with keystroke echo, it is halved down to minimum.
+    """
+
+    SHRINK_AFTER = 8
+
+    def __init__(self, minimum: int, maximum: int) -> None:
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.size = minimum
+        self.small_reads = 0
+
+    def update(self, n: int) -> bool:
+        """Update with bytes read, return True if size changed"""
+        if n >= self.size:
+            self.small_reads = 0
+            if self.size < self.maximum:
+                self.size = min(self.size * 2, self.maximum)
+                return True
+            return False
+
+        if n >= self.size // 4:
+            self.small_reads = 0
+            return False
+
+        self.small_reads += 1
+        if self.small_reads >= self.SHRINK_AFTER and self.size > self.minimum:
+            self.small_reads = 0
+            self.size = max(self.size // 2, self.minimum)
+            return True
+        return False
+
+    def busy(self) -> bool:
+        """Data has recently been arriving faster than the minimum chunk"""
+        return self.size > self.minimum
+
+
+class ByteRing:
+    """Byte ring buffer for one producer and one consumer thread.
+
+    The producer only advances head and the consumer only advances tail,
+    both count bytes since start. Each is a single assignment, so the two
+    threads share the ring without a lock.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.buf = bytearray(size)
+        self.size = size
+        self.head = 0  # Bytes written
+        self.tail = 0  # Bytes read
+
+    def __len__(self) -> int:
+        return self.head - self.tail
+
+    def free(self) -> int:
+        return self.size - (self.head - self.tail)
+
+    def write(self, data: bytes) -> int:
+        """Write as much of data as fits, return number of bytes written"""
+        n = min(len(data), self.free())
+        start = self.head % self.size
+        first = min(n, self.size - start)
+        self.buf[start : start + first] = data[:first]
+        self.buf[: n - first] = data[first:n]
+        self.head += n
+        return n
+
+    def read(self) -> bytes:
+        """Read all bytes in the ring"""
+        head = self.head
+        start = self.tail % self.size
+        stop = start + head - self.tail
+        if stop <= self.size:
+            data = bytes(self.buf[start:stop])
+        else:
+            data = bytes(self.buf[start:]) + bytes(self.buf[: stop - self.size])
+        self.tail = head
+        return data
+
+
+class SerialReader(QThread):
+    """Reads a serial port file descriptor in a thread of its own.
+
+    Received data is kept in a ByteRing until the GUI thread takes it, one
+    data_ready signal is sent per batch. When the ring is full the reader
+    holds off if the port has flow control, so the device is stopped,
+    otherwise it keeps draining the port and counts the dropped bytes.
+    """
+
+    data_ready = pyqtSignal()
+
+    CHUNK = 4096  # Max bytes per read
+    POLL = 0.05  # Seconds between checks for stop request
+
+    def __init__(self, fd: int, ring_size: int, hold: bool, parent=None) -> None:
+        super().__init__(parent)
+        self.fd = fd
+        self.ring = ByteRing(ring_size)
+        self.hold = hold
+        self.notified = False  # data_ready sent and not yet taken
+        # Written by the reader thread only
+        self.holds = 0  # Times reading was held off by a full ring
+        self.dropped = 0  # Bytes lost to a full ring
+
+    def run(self) -> None:
+        held = False
+        while not self.isInterruptionRequested():
+            free = self.ring.free()
+            if free == 0 and self.hold:
+                if not held:
+                    held = True
+                    self.holds += 1
+                self.msleep(1)
+                continue
+            held = False
+
+            try:
+                readable, _, _ = select.select([self.fd], [], [], self.POLL)
+                if not readable:
+                    continue
+                data = os.read(self.fd, min(free, self.CHUNK) or self.CHUNK)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError as e:
+                logging.error(f"Serial read failed: {e}")
+                return
+
+            if len(data) == 0:  # Hangup
+                return
+
+            self.dropped += len(data) - self.ring.write(data)
+            if not self.notified:
+                self.notified = True
+                self.data_ready.emit()
+
+    def take(self) -> bytes:
+        """Take all received data, called from the GUI thread"""
+        self.notified = False  # Before reading, data written after is notified
+        return self.ring.read()
+
+    def stop(self) -> None:
+        self.requestInterruption()
+        self.wait()
+
 
 class SerialPort(QSerialPort):
+    RX_RING_SIZE = 1 << 20  # Bytes buffered by the reader thread
+    READ_BUFFER_MAX = 1 << 16  # Largest read buffer in adaptive mode
+
     def __init__(self) -> None:
         super().__init__()
 
+        self.reader: SerialReader = None
+        self.threaded = False
+        self.holds_base = 0
+        self.dropped_base = 0
         self.clear_counters()
+        self.decoder = StreamDecoder()
+        self.set_read_buffer(256, ReadMode.FIXED)
+
+        self.capture: CaptureWriter = None  # Recording of data sent and received
+        self.capture_timer = QTimer(self)
+        self.capture_timer.setInterval(int(CaptureWriter.FLUSH_INTERVAL * 1000))
+        self.capture_timer.timeout.connect(lambda: self.capture.poll())
         # self.serial_state = State.DISCONNECTED
 
         # self.suspend_timer = QTimer()
@@ -72,15 +278,87 @@ class SerialPort(QSerialPort):
         self.cntReconnect = 0
 
     def read_str(self) -> str:
-        data = self.read()
-        data_str = str(data, "utf-8")
-        return data_str
+        return self.decode(self.read())
+
+    def decode(self, data) -> str:
+        """Decode data read from port, characters split between reads are kept whole"""
+        return self.decoder.decode(data)
 
     def read(self):
-        data = self.readAll()
+        if self.reader is not None:
+            data = QByteArray(self.reader.take())
+        else:
+            data = self.readAll()
         self.cnt_rx += data.count()
+        if self.capture is not None and data.count() > 0:
+            self.capture.write(Direction.RX, bytes(data))
+
+        # Resizing QSerialPort buffer would enable its read notifier again
+        if self.sizer.update(data.count()) and self.reader is None:
+            self.setReadBufferSize(self.sizer.size)
         return data
 
+    def set_read_buffer(self, size: int, mode: ReadMode) -> None:
+        """Set bytes read at most per read, or the initial and smallest size
+        in adaptive mode"""
+        size = max(size, 1)
+        maximum = max(size, self.READ_BUFFER_MAX) if mode == ReadMode.ADAPTIVE else size
+        self.read_mode = mode
+        self.sizer = ReadSizer(size, maximum)
+        self.setReadBufferSize(size)
+
+    def busy(self) -> bool:
+        """Data is arriving faster than the smallest read buffer takes it"""
+        return self.sizer.busy()
+
+    def start_capture(self, filename: str) -> None:
+        """Record data sent and received to capture file, appending to it if
+        it exists. Raises OSError or ValueError if file can't be used."""
+        self.stop_capture()
+        self.capture = CaptureWriter(filename)
+        self.capture_timer.start()
+
+    def stop_capture(self) -> None:
+        if self.capture is not None:
+            self.capture_timer.stop()
+            self.capture.close()
+            self.capture = None
+
+    def set_threaded(self, threaded: bool) -> None:
+        """Read port in a thread of its own, takes effect when port is opened"""
+        self.threaded = threaded
+
+    def start_reader(self) -> None:
+        """Move reading from the GUI thread to a SerialReader. QSerialPort's
+        read notifier is disabled so the reader is the only one reading."""
+        for notifier in self.findChildren(QSocketNotifier):
+            if notifier.type() == QSocketNotifier.Read:
+                notifier.setEnabled(False)
+
+        hold = self.flowControl() != QSerialPort.NoFlowControl
+        self.reader = SerialReader(self.handle(), self.RX_RING_SIZE, hold)
+        self.reader.data_ready.connect(self.readyRead)
+        self.holds_base = 0
+        self.dropped_base = 0
+        self.reader.start()
+
+    def stop_reader(self) -> None:
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
+
+    def rx_holds(self) -> int:
+        """Times the reader held off because data was not taken in time"""
+        return 0 if self.reader is None else self.reader.holds - self.holds_base
+
+    def rx_dropped(self) -> int:
+        """Bytes lost because data was not taken in time"""
+        return 0 if self.reader is None else self.reader.dropped - self.dropped_base
+
+    def rx_buffered(self) -> int:
+        """Bytes received by the reader and not yet taken"""
+        return 0 if self.reader is None else len(self.reader.ring)
+
     def print(self) -> None:
         pass
         logging.debug(f"Port: {self.portName()}")
@@ -96,10 +374,15 @@ class SerialPort(QSerialPort):
         if self.isOpen():
             return True
         res = super().open(QIODevice.ReadWrite)
+        if res:
+            self.decoder.reset()  # Nothing left from the last connection
+            if self.threaded:
+                self.start_reader()
 
         return res
 
     def close(self) -> None:
+        self.stop_reader()  # Before the descriptor is closed
         super().close()
 
     def clear(self) -> None:
@@ -109,6 +392,9 @@ class SerialPort(QSerialPort):
     def clear_counters(self):
         self.cnt_rx = 0
         self.cnt_tx = 0
+        if self.reader is not None:  # Reader counters are only written by its thread
+            self.holds_base = self.reader.holds
+            self.dropped_base = self.reader.dropped
 
     def send_string(self, data: str):
         self.send(bytearray(data, "utf-8"))
@@ -118,6 +404,8 @@ class SerialPort(QSerialPort):
             res = self.write(data)
             if res > 0:
                 self.cnt_tx += res
+                if self.capture is not None:
+                    self.capture.write(Direction.TX, bytes(data)[:res])
             else:
                 logging.error("Could not write data.")
 
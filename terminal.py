@@ -31,13 +31,20 @@
 #
 
 from __future__ import annotations
+from array import array
+from collections import OrderedDict
 from copy import copy
-from enum import Enum
+from enum import Enum, IntFlag
 from dataclasses import dataclass, field
 import logging
+import re
 from typing import Any
+import weakref
 
 from escape import Ascii, Ansi
+from decoder import StreamDecoder
+from enumlookup import EnumLookup
+from mptrace import Trace
 from terminal_colors import (
     PalettePutty,
     Palette256,
@@ -62,19 +69,16 @@ class PrivateSequence(Enum):
     # LINES_PER_SCREEN = 9  # l = 36, h = 24(default)
     CURSOR = 25  # Show/hide cursor, h=show, l=hide
     # REPORT_FOCUS = 1004
-    # ALT_SCREEN_BUFFER = 1049 # h=on, l=off
+    ALT_SCREEN_BUFFER = 1049  # h=on, l=off
     BRACKEDED_PASTE_MODE = 2004  # h=on, l=off
     UNSUPPORTED = 0xFFFF
 
     @staticmethod
     def decode(seq: int) -> PrivateSequence:
-        for ps in PrivateSequence:
-            if seq == ps.value:
-                # logging.debug(f'Found: {ps}  "{seq}"')
-                return ps
+        return PRIVATE_SEQUENCES(seq)
 
-        # logging.debug(f'Found: {PrivateSequence.UNSUPPORTED}  "{seq}"')
-        return PrivateSequence.UNSUPPORTED
+
+PRIVATE_SEQUENCES = EnumLookup(PrivateSequence, PrivateSequence.UNSUPPORTED)
 
 
 class TextType(Enum):
@@ -117,6 +121,9 @@ class C1Type(Enum):
     UNSUPPORTED = "UNSUPPORTED"
 
 
+C1_TYPES = EnumLookup(C1Type, C1Type.UNSUPPORTED)
+
+
 class CSIType(Enum):
     """Control Sequence Introducer
 
@@ -171,13 +178,13 @@ class CSIType(Enum):
 
         tc = s[-1]  # termination character in Escape sequence
 
-        for csi in CSIType:
-            if tc == csi.value:
-                logging.debug(f'Found: {csi}  "{Ansi.to_str(s)}"')
-                return csi
+        csi = CSI_TYPES(tc)
+        if Trace.CSI:
+            logging.debug(f'Found: {csi}  "{Ansi.to_str(s)}"')
+        return csi
 
-        logging.debug(f'Found: {CSIType.UNSUPPORTED}  "{Ansi.to_str(s)}"')
-        return CSIType.UNSUPPORTED
+
+CSI_TYPES = EnumLookup(CSIType, CSIType.UNSUPPORTED)
 
 
 class SGRType(Enum):
@@ -264,11 +271,11 @@ class SGRType(Enum):
         return False
 
     @staticmethod
-    def find_sgr(sgr_code: str) -> SGRType:
-        for e in SGRType:
-            if sgr_code == e.value:
-                return e
-        return SGRType.UNSUPPORTED
+    def find_sgr(sgr_code: int) -> SGRType:
+        return SGR_TYPES(sgr_code)
+
+
+SGR_TYPES = EnumLookup(SGRType, SGRType.UNSUPPORTED)
 
 
 @dataclass
@@ -276,7 +283,7 @@ class SGR:
     """Select Graphic Rendition"""
 
     type: SGRType = SGRType.UNSUPPORTED
-    color: str = None
+    color: int | str = None  # 256 color index or truecolor #rrggbb
 
     def decode(self, attrs: list[str]) -> int:
         """Decodes SGR attributes
@@ -310,10 +317,15 @@ class SGR:
                 self.color = int(attrs[2])
                 ret = 3
 
-            # Truecolor mode
+            # Truecolor mode, color is kept as #rrggbb
             if color_mode == 2:
-                # xx.append({"SGR":SGR.find_sgr(c), "color":int(sp[2])})
-                pass
+                rgb = attrs[2:5]
+                if len(rgb) == 3 and all(c.isdigit() for c in rgb):
+                    r, g, b = (min(int(c), 255) for c in rgb)
+                    self.color = f"#{r:02x}{g:02x}{b:02x}"
+                else:  # Missing or empty color components
+                    self.type = SGRType.UNSUPPORTED
+                ret = 2 + len(rgb)
 
         # Handle underline style
         if self.type == SGRType.UNDERLINE:
@@ -345,12 +357,9 @@ class EscapeObj:
 
         self.text = Ansi.to_str(seq)
 
-        for type in C1Type:
-            if seq[1] == type.value:
-                self.type = type
+        self.type = C1_TYPES(seq[1])
 
         if self.type == C1Type.UNSUPPORTED:
-            logging.debug(f"{str(self)}")
             return None
 
         if self.type == C1Type.CSI:
@@ -359,18 +368,19 @@ class EscapeObj:
 
     def decode_csi(self, seq: str) -> None:
 
-        for csi in CSIType:
-            if seq[-1] == csi.value:
-                self.csitype = csi
+        self.csitype = CSI_TYPES(seq[-1])
 
         if self.csitype == CSIType.UNSUPPORTED:
-            logging.debug(f"{str(self)}")
             return None
 
         # The following CSI's has 0 as default for n
         if self.csitype in [CSIType.ERASE_IN_DISPLAY, CSIType.ERASE_IN_LINE]:
             self.n = 0
 
+        # Bottom row 0 is the last row of the screen
+        if self.csitype == CSIType.SET_SCROLLING_REGION:
+            self.m = 0
+
         # remove questionmark "?" if private sequence
         if self.csitype in (CSIType.ENABLE, CSIType.DISABLE):
             seq = seq.replace("?", "")
@@ -390,8 +400,11 @@ class EscapeObj:
         if self.csitype in (CSIType.ENABLE, CSIType.DISABLE):
             self.private_sequence = PrivateSequence.decode(self.n)
 
-        logging.debug(f"{str(self)}")
-        if self.csitype == CSIType.SGR:
+    def trace(self) -> None:
+        """Debug printout of a decoded sequence, each time it is used"""
+        if Trace.CSI and self.type in (C1Type.UNSUPPORTED, C1Type.CSI):
+            logging.debug(f"{str(self)}")
+        if Trace.SGR and self.type == C1Type.CSI and self.csitype == CSIType.SGR:
             for sgr in self.sgrs:
                 logging.debug(f"            {sgr}")
 
@@ -408,6 +421,17 @@ class EscapeObj:
 
             self.sgrs.append(sgr)
 
+    def freeze(self) -> EscapeObj:
+        """Make object immutable, shared objects from EscapeCache are frozen"""
+        self.sgrs = tuple(self.sgrs)
+        self.frozen = True
+        return self
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if self.__dict__.get("frozen", False):
+            raise AttributeError(f"Frozen EscapeObj, can not set {name}")
+        super().__setattr__(name, value)
+
     def __str__(self) -> str:
         if self.type != C1Type.CSI:
             return f"{self.type:20} {str(self.text):12}"
@@ -422,30 +446,105 @@ class EscapeObj:
         # return f"{self.csi:20} n={self.n:<2} m={self.m:<2}"
 
 
+class EscapeCache:
+    """LRU cache of decoded escape sequences, keyed by the raw sequence"""
+
+    def __init__(self, size: int = 1024) -> None:
+        self.size = size
+        self.clear()
+
+    def clear(self) -> None:
+        self.cache: OrderedDict[str, EscapeObj] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, seq: str) -> EscapeObj:
+        """Return decoded (frozen) escape object for sequence"""
+        eo = self.cache.get(seq)
+        if eo is not None:
+            self.hits += 1
+            self.cache.move_to_end(seq)
+            return eo
+
+        self.misses += 1
+        eo = EscapeObj()
+        eo.decode(seq)
+        self.cache[seq] = eo.freeze()
+        if len(self.cache) > self.size:
+            self.cache.popitem(last=False)  # Evict least recently used
+        return eo
+
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    def __str__(self) -> str:
+        return f"Escape cache: {len(self.cache)}/{self.size} hits={self.hits} misses={self.misses} ratio={self.hit_ratio():.3f}"
+
+
+class TokenizerMode(Enum):
+    CHARACTER = 0  # Escape sequences are checked for termination per character
+    PATTERN = 1  # Tokens are matched with one compiled pattern
+
+
 class EscapeTokenizer:
     """Tokenize escape sequences"""
 
-    def __init__(self):
+    # Characters that terminates a text run or an escape sequence
+    CONTROLS = (Ascii.LF, Ascii.BEL, Ascii.BS, Ascii.CR)
+    SPECIAL = re.compile(r"[\x07\x08\x0a\x0d\x1b]")
+
+    # One token per match, same rules as is_terminated().
+    #   ctrl - Single control character
+    #   text - Printable run up to next control or escape character
+    #   esc  - Complete Fp/Fs, "(" charset or CSI sequence
+    #   part - Unterminated sequence, complete only if followed by more data
+    TOKEN = re.compile(
+        r"(?P<ctrl>[\x07\x08\x0a\x0d])"
+        r"|(?P<text>[^\x07\x08\x0a\x0d\x1b]+)"
+        r"|(?P<esc>\x1b(?:[\x30-\x3f\x60-\x7e]"
+        r"|\([^\x07\x08\x0a\x0d\x1b]"
+        r"|\[[^\x07\x08\x0a\x0d\x1b\x40-\x5a\x5c-\x7e]*[\x40-\x5a\x5c-\x7e]))"
+        r"|(?P<part>\x1b[^\x07\x08\x0a\x0d\x1b]*)"
+    )
+
+    def __init__(self, mode: TokenizerMode = TokenizerMode.PATTERN):
+        self.decoder = StreamDecoder()  # For data appended as bytes
+        self.set_mode(mode)
         self.clear()
 
+    def set_mode(self, mode: TokenizerMode) -> None:
+        """Select tokenizer engine, both produce the same token stream"""
+        self.mode = mode
+        if mode == TokenizerMode.PATTERN:
+            self.next_token = self.next_pattern
+        else:
+            self.next_token = self.next_character
+
     def clear(self):
-        self.seq = ""
-        self.lbuf = []
+        self.decoder.reset()
+        self.buf = ""  # Received data
+        self.idx = 0  # Start of unconsumed data in buf
+        self.scan_idx = 0  # Scan position in an incomplete escape sequence
 
     def append_string(self, data: str) -> None:
-        self.lbuf.extend(list(data))
+        # Drop consumed data, only an incomplete escape sequence can remain
+        self.scan_idx -= self.idx
+        self.buf = self.buf[self.idx :] + data
+        self.idx = 0
 
     def append_bytearray(self, data: bytearray) -> None:
-        utf = data.decode("utf-8")
-        self.lbuf.extend(list(utf))
+        self.append_string(self.decoder.decode(data))
 
-    def is_csi(self) -> bool:
-        """Check if sequence string is CSI terminated"""
+    def is_csi(self, start: int, end: int) -> bool:
+        """Check if sequence buf[start:end] is CSI terminated"""
 
-        if self.seq[1] != C1Type.CSI.value:
+        if self.buf[start + 1] != C1Type.CSI.value:
             return False
 
-        lc = ord(self.seq[-1])
+        lc = ord(self.buf[end - 1])
         if lc == 0x5B:  # "[" is excluded as terminator, possibly wrong
             return False
 
@@ -454,93 +553,268 @@ class EscapeTokenizer:
 
         return False
 
-    def is_Fp(self) -> bool:
+    def is_Fp(self, start: int) -> bool:
         """Check if independent function dequence"""
 
-        lc = ord(self.seq[1])
+        lc = ord(self.buf[start + 1])
         if (lc >= 0x60) and (lc <= 0x7E):
             return True
 
-    def is_Fs(self) -> bool:
+    def is_Fs(self, end: int) -> bool:
         """Check if private two character sequence"""
 
-        lc = ord(self.seq[-1])
+        lc = ord(self.buf[end - 1])
         if (lc >= 0x30) and (lc <= 0x3F):
             return True
 
-    def is_terminated(self) -> bool:
-        """Check if Escape sequence is terminated"""
+    def is_terminated(self, start: int, end: int) -> bool:
+        """Check if Escape sequence buf[start:end] is terminated"""
 
-        seq_len = len(self.seq)
+        seq_len = end - start
 
         if seq_len <= 1:
             return False
 
         if seq_len == 2:
-            if self.is_Fp() is True:
+            if self.is_Fp(start) is True:
                 return True
 
-            if self.is_Fs() is True:
+            if self.is_Fs(end) is True:
                 return True
 
-        if seq_len == 3 and self.seq[1] == "(":
+        if seq_len == 3 and self.buf[start + 1] == "(":
             return True
 
-        if self.is_csi() is True:
+        if self.is_csi(start, end) is True:
             return True
 
         return False
 
     def __iter__(self):
-        self.i = 0
         return self
 
     def __next__(self) -> str:
-        try:
-            while True:
-                ch = self.lbuf.pop(0)  # get next character from buffer
+        return self.next_token()
+
+    def next_pattern(self) -> str:
+        """Return next token, matched with the token pattern"""
+        start = self.idx
+        m = self.TOKEN.match(self.buf, start)
+        if m is None:
+            raise StopIteration  # No data left
+
+        end = m.end()
+        if m.lastgroup == "part" and end == len(self.buf):
+            raise StopIteration  # Incomplete escape sequence, wait for more data
+
+        self.idx = end
+        return self.buf[start:end]
+
+    def next_character(self) -> str:
+        """Return next token, escape sequences checked character by character"""
+        buf = self.buf
+        start = self.idx
+        end = len(buf)
+
+        if start >= end:
+            raise StopIteration
+
+        ch = buf[start]
+        if ch in self.CONTROLS:
+            self.idx = start + 1
+            return ch
+
+        # Normal text, consume everything up to next control or escape character
+        if ch != Ascii.ESC:
+            m = self.SPECIAL.search(buf, start)
+            stop = end if m is None else m.start()
+            self.idx = stop
+            return buf[start:stop]
+
+        # Escape sequence, resume scanning where last chunk ended
+        i = max(start + 1, self.scan_idx)
+        while i < end:
+            if buf[i] in self.CONTROLS or buf[i] == Ascii.ESC:
+                break  # Sequence interrupted, return it as is
+            i += 1
+            if self.is_terminated(start, i) is True:
+                break
+        else:
+            # Incomplete escape sequence, wait for more data
+            self.scan_idx = i
+            raise StopIteration
 
-                if ch in [Ascii.LF, Ascii.BEL, Ascii.BS, Ascii.CR]:
-                    if len(self.seq) > 0:
-                        ret = self.seq
-                        self.seq = ""
-                        self.lbuf.insert(0, ch)
-                        return ret
-                    return ch
+        self.idx = i
+        self.scan_idx = 0
+        return buf[start:i]
 
-                if ch == Ascii.ESC:  # Escape sequence start character found
-                    if len(self.seq) > 0:
-                        ret = self.seq
-                        self.seq = ch
-                        return ret
 
-                    self.seq = ch
-                    continue
+@dataclass
+class TerminalCoordinate:
+    row: int = 1
+    column: int = 1
 
-                self.seq += ch
 
-                if self.seq[0] == Ascii.ESC:
-                    if self.is_terminated() is True:
-                        ret = self.seq
-                        self.seq = ""
-                        return ret
+class TextFlag(IntFlag):
+    """Text attribute bits, packed into TerminalStyle.flags"""
 
-        except IndexError:
-            if len(self.seq) == 0:
-                raise StopIteration
+    BOLD = 1
+    DIM = 2
+    ITALIC = 4
+    CROSSED = 8
+    UNDERLINE = 16
+    SUPERSCRIPT = 32
+    SUBSCRIPT = 64
+    REVERSE = 128
+    OVERLINE = 256
+    CURSOR = 512
 
-            if self.seq[0] == Ascii.ESC:
-                raise StopIteration
 
-            ret = self.seq
-            self.seq = ""
-            return ret
+@dataclass(frozen=True)
+class TerminalStyle:
+    """Immutable text style, one shared instance per unique set of attributes"""
 
+    flags: int = 0
+    fg_color: str = ""
+    bg_color: str = ""
+
+    def has(self, flag: TextFlag) -> bool:
+        return (self.flags & flag) != 0
+
+    def __str__(self) -> str:
+        return f"{self.flags:010b} {self.fg_color} {self.bg_color}"
+
+
+class StyleTable:
+    """Flyweight table of interned styles, characters only store the style id.
+
+    When the table grows past size, styles no longer used by the lines of any
+    registered terminal are dropped and the others renumbered. Caches keyed
+    by style id must be cleared when generation changes.
+    """
+
+    def __init__(self, size: int = 4096) -> None:
+        self.size = size
+        self.limit = size  # Number of styles causing next compaction
+        self.generation = 0  # Incremented when style ids are renumbered
+        self.owners: weakref.WeakSet[TerminalState] = weakref.WeakSet()
+        self.styles: list[TerminalStyle] = []
+        self.ids: dict[tuple[int, str, str], int] = {}
+
+    def register(self, owner: TerminalState) -> None:
+        """Add terminal whose lines keep styles in use"""
+        self.owners.add(owner)
+
+    def intern(self, flags: int, fg_color: str, bg_color: str) -> int:
+        """Return id of style, adding it to table if not present"""
+        key = (flags, fg_color, bg_color)
+        style_id = self.ids.get(key)
+        if style_id is None:
+            if len(self.styles) >= self.limit:
+                self.compact()
+            style_id = len(self.styles)
+            self.styles.append(TerminalStyle(flags, fg_color, bg_color))
+            self.ids[key] = style_id
+        return style_id
+
+    def compact(self) -> None:
+        """Drop styles not used by any line, renumbering the style ids left"""
+        arrays: dict[int, array[int]] = {}  # A line may be both in lines and touched
+        for owner in self.owners:
+            for line in owner.style_lines():
+                arrays[id(line.styles)] = line.styles
+
+        used = sorted(set().union(*arrays.values()))
+        new_ids = [0] * len(self.styles)
+        for new_id, style_id in enumerate(used):
+            new_ids[style_id] = new_id
+        for styles in arrays.values():
+            styles[:] = array("I", [new_ids[style_id] for style_id in styles])
+
+        self.styles = [self.styles[style_id] for style_id in used]
+        self.ids = {
+            (style.flags, style.fg_color, style.bg_color): style_id
+            for style_id, style in enumerate(self.styles)
+        }
+        # Leave room for new styles if most of them are in use
+        self.limit = max(self.size, 2 * len(self.styles))
+        self.generation += 1
+
+    def __getitem__(self, style_id: int) -> TerminalStyle:
+        return self.styles[style_id]
+
+    def __len__(self) -> int:
+        return len(self.styles)
+
+
+STYLES = StyleTable()
+
+# Single pass translation table for text inside html spans
+HTML_ESCAPE = str.maketrans({" ": "&nbsp;", "<": "&lt;", ">": "&gt;"})
+
+
+class SpanTagCache:
+    """Opening <span> tags for styles, built once per style id and cursor.
+
+    The cursor cell is shown with reversed colors, so (style id, cursor)
+    gives the same tag as (style, reversed) without testing the flags.
+    """
+
+    def __init__(self, size: int = 1024) -> None:
+        self.size = size
+        self.clear()
+
+    def clear(self) -> None:
+        self.tags: OrderedDict[tuple[int, bool], str] = OrderedDict()
+        self.generation = STYLES.generation
+
+    def tag(self, style_id: int, cursor: bool) -> str:
+        if self.generation != STYLES.generation:
+            self.clear()  # Style ids renumbered
+        key = (style_id, cursor)
+        tag = self.tags.get(key)
+        if tag is not None:
+            self.tags.move_to_end(key)
+            return tag
+
+        style = STYLES[style_id]
+        tag = self.build(style, cursor != style.has(TextFlag.REVERSE))
+        self.tags[key] = tag
+        if len(self.tags) > self.size:
+            self.tags.popitem(last=False)  # Evict least recently used
+        return tag
+
+    def build(self, style: TerminalStyle, reversed: bool) -> str:
+        if reversed:
+            bg_color = style.fg_color
+            fg_color = style.bg_color
+        else:
+            fg_color = style.fg_color
+            bg_color = style.bg_color
+
+        b = [
+            f'<span style="color:{fg_color};background-color:{bg_color};font-size:12pt;'
+        ]
+
+        if style.has(TextFlag.BOLD):
+            b.append("font-weight:bold;")
+        if style.has(TextFlag.ITALIC):
+            b.append("font-style:italic;")
+        if style.has(TextFlag.UNDERLINE):
+            b.append("text-decoration:underline;")
+        if style.has(TextFlag.CROSSED):
+            b.append("text-decoration:line-through;")
+        if style.has(TextFlag.OVERLINE):
+            b.append("text-decoration:overline;")
+
+        b.append('">')
+        return "".join(b)
+
+    def __len__(self) -> int:
+        return len(self.tags)
 
-@dataclass
-class TerminalCoordinate:
-    row: int = 1
-    column: int = 1
+
+SPAN_TAGS = SpanTagCache()
 
 
 @dataclass
@@ -584,87 +858,116 @@ class TerminalAttributeState:
         self.BG_COLOR = self.DEFAULT_BG_COLOR
         self.CURSOR = False
 
-    def __str__(self) -> str:
-        state: int = 0
+    def flags(self) -> int:
+        """Text attributes packed as TextFlag bits, cursor excluded"""
+        flags: int = 0
         if self.BOLD is True:
-            state += 1
+            flags += 1
         if self.DIM is True:
-            state += 2
+            flags += 2
         if self.ITALIC is True:
-            state += 4
+            flags += 4
         if self.CROSSED is True:
-            state += 8
+            flags += 8
         if self.UNDERLINE is True:
-            state += 16
+            flags += 16
         if self.SUPERSCRIPT is True:
-            state += 32
+            flags += 32
         if self.SUBSCRIPT is True:
-            state += 64
+            flags += 64
         if self.REVERSE is True:
-            state += 128
+            flags += 128
         if self.OVERLINE is True:
-            state += 256
-        if self.CURSOR is True:
-            state += 512
-        return f"{state:010b}"
+            flags += 256
+        return flags
 
-
-class TerminalCharacter:
-    def __init__(self, ch: str, tas: TerminalAttributeState):
-        self.tas = copy(tas)
-        self.ch = ch
-        self.cursor: bool = False
+    def style_id(self) -> int:
+        """Return interned style id for current attributes"""
+        return STYLES.intern(self.flags(), self.FG_COLOR, self.BG_COLOR)
 
     def __str__(self) -> str:
-        return f"{self.tas} {self.ch}"
+        state = self.flags()
+        if self.CURSOR is True:
+            state += 512
+        return f"{state:010b}"
 
 
 class TerminalLine:
+    """Terminal line, stored as a character array and a parallel style id array"""
+
     def __init__(
-        self, tas: TerminalAttributeState, id: int = 0, columns: int = 80
+        self,
+        tas: TerminalAttributeState,
+        id: int = 0,
+        columns: int = 80,
+        touched: list[TerminalLine] = None,
     ) -> None:
-        self.line: list[TerminalCharacter] = []
-        for i in range(0, columns):
-            self.line.append(TerminalCharacter(" ", tas))
+        self.chars: list[str] = [" "] * columns
+        self.styles: array[int] = array("I", [tas.style_id()]) * columns
         self.tas = tas
         self.id: int = id
-        self.text: str = ""
+        self.touched = touched  # Line is added here when it becomes changed
+        self.text_cache: str = None
         self.changed: bool = False
         self.cursor = None
         self.old_cursor = None
+        self.cursor_idx: int = -1  # Cursor cell when set_cursor was called
+        self.dirty_start: int = 0  # Cells in range dirty_start to dirty_stop
+        self.dirty_stop: int = columns  # has changed since last reset
 
     def __str__(self) -> str:
-        tchars = []
-        for tc in self.line:
-            # tchars.append(str(tc))
-            tchars.append(tc.ch)
+        return f"Id={self.id} {''.join(self.chars)}"
+
+    def __len__(self) -> int:
+        return len(self.chars)
+
+    def fill(self, start: int, stop: int, style: int) -> None:
+        """Set characters in range start to stop to " " with style, growing line if needed"""
+        n = stop - start
+        self.chars[start:stop] = [" "] * n
+        self.styles[start:stop] = array("I", [style]) * n
+        self.mark_dirty(start, stop)
+
+    def mark_dirty(self, start: int, stop: int) -> None:
+        """Extend dirty span to include cells in range start to stop"""
+        if start < self.dirty_start:
+            self.dirty_start = start
+        if stop > self.dirty_stop:
+            self.dirty_stop = stop
 
-        return f"Id={self.id} {"".join(tchars)}"
+    def dirty_span(self) -> tuple[int, int]:
+        """Return range of cells changed since last reset"""
+        return max(self.dirty_start, 0), min(self.dirty_stop, len(self.chars))
+
+    def is_fully_dirty(self) -> bool:
+        start, stop = self.dirty_span()
+        return start == 0 and stop >= len(self.chars)
 
     def clear(self):
         """Clear all character to " " and set attributes do default"""
-        for ch in self.line:
-            ch.tas = self.tas
-            ch.ch = " "
+        self.fill(0, len(self.chars), self.tas.style_id())
+        self.text_cache = None
 
     def reset(self):
         self.changed = False
         self.old_cursor = self.cursor
         self.cursor = None
-
-        for ch in self.line:
-            ch.tas.CURSOR = False
+        self.dirty_start = len(self.chars)
+        self.dirty_stop = 0
+        if self.cursor_idx >= 0:  # Cursor cell is redrawn if cursor moves
+            self.mark_dirty(self.cursor_idx, self.cursor_idx + 1)
+            self.cursor_idx = -1
 
     def set_cursor(self, cursor: TerminalCoordinate) -> None:
         """Calling set_cursor indicates that the cursor i located on this particular line"""
         # print(f"Cursor on id: {self.id} line: {cursor}")
         self.cursor = cursor
-        try:
-            self.line[cursor.column - 1].tas.CURSOR = True
-        except IndexError:
-            logging.debug(f"IndexError: {cursor=} {len(self.line)}")
+        self.cursor_idx = cursor.column - 1
+        self.mark_dirty(self.cursor_idx, self.cursor_idx + 1)
+        if cursor.column > len(self.chars):
+            logging.debug(f"IndexError: {cursor=} {len(self.chars)}")
 
-        self.changed = True
+        self.touch()
 
     def has_changed(self, cursor: TerminalCoordinate = None) -> bool:
         """Check if line has changed since last update"""
@@ -672,108 +975,82 @@ class TerminalLine:
         # if cursor is not None it means that the cursor is present on this particular row
         # self.cursor = cursor
         if self.old_cursor != self.cursor:
-            self.changed = True
+            self.touch()
 
         return self.changed
 
-    def is_reversed(self, tas: TerminalAttributeState) -> bool:
-        """Check if text is reversed"""
-        # print(f"Cursor on id: {self.id} line: {self.cursor}")
-        if tas.CURSOR is True:
-            # print("cursor")
-            return not tas.REVERSE
-
-        return tas.REVERSE
-
-    def attr_to_html(self, data: str, tas: TerminalAttributeState) -> str:
+    def attr_to_html(self, data: str, style_id: int, cursor: bool = False) -> str:
         """Convert terminal attributes to htmltags"""
-
-        if self.is_reversed(tas):
-            bg_color = tas.FG_COLOR
-            fg_color = tas.BG_COLOR
-        else:
-            fg_color = tas.FG_COLOR
-            bg_color = tas.BG_COLOR
-
-        b = f'<span style="color:{fg_color};background-color:{bg_color};font-size:12pt;'
-
-        if tas.BOLD:
-            b += "font-weight:bold;"
-        if tas.ITALIC:
-            b += "font-style:italic;"
-        if tas.UNDERLINE:
-            b += "text-decoration:underline;"
-        if tas.CROSSED:
-            b += "text-decoration:line-through;"
-        if tas.OVERLINE:
-            b += "text-decoration:overline;"
-
-        b += '">'
-        b += data.replace(" ", "&nbsp;").replace("<", "&lt;").replace(">", "&gt;")
-        b += "</span>"
-        return b
+        return f"{SPAN_TAGS.tag(style_id, cursor)}{data.translate(HTML_ESCAPE)}</span>"
 
     def line_to_html(self) -> str:
         """Convert line to html, including attributes and cursor"""
-        line_text = []
-        line_text.append('<div style="line-height:30px;">')
-        text = ""
-        for idx, tc in enumerate(self.line):
-            if idx == 0:
-                tas = tc.tas
-
-            # if self.cursor is not None:
-            #     if idx == (self.cursor.column - 1):
-            #         tas.CURSOR = True
-            #     else:
-            #         tas.CURSOR = False
-
-            # else:
-            #     tas.CURSOR = False
-
-            if tas == tc.tas:
-                text += tc.ch
-            else:
-                line_text.append(self.attr_to_html(text, tas))
-                text = tc.ch
-                tas = tc.tas
-
-        if len(text) > 0:
-            line_text.append(self.attr_to_html(text, tas))
-
-        line_text.append("</div>")
-
-        # if self.cursor is not None:
-        #     print(f"Cursor on id: {self.id} line: {self.cursor}")
+        return "".join(
+            [
+                '<div style="line-height:30px;">',
+                *self.span_to_html(0, len(self.chars)),
+                "</div>",
+            ]
+        )
 
-        return "".join(line_text)
+    def runs(self, start: int, stop: int) -> list[tuple[int, int]]:
+        """Split cells in range start to stop into runs of equal style,
+        the cursor cell is always a run of its own"""
+        styles = self.styles[start:stop]
+        bounds = [
+            idx
+            for idx, (a, b) in enumerate(zip(styles, styles[1:]), start + 1)
+            if a != b
+        ]
+        if self.cursor is not None:
+            cursor_idx = self.cursor.column - 1
+            if start <= cursor_idx < stop:
+                bounds.extend((cursor_idx, cursor_idx + 1))
+                bounds = sorted(set(bounds))
+
+        bounds = [start, *bounds, stop]
+        return [(a, b) for a, b in zip(bounds, bounds[1:]) if a < b]
+
+    def span_to_html(self, start: int, stop: int) -> list[str]:
+        """Convert cells in range start to stop to list of html spans"""
+        cursor_idx = -1 if self.cursor is None else self.cursor.column - 1
+        return [
+            self.attr_to_html(
+                "".join(self.chars[run_start:run_stop]),
+                self.styles[run_start],
+                run_start == cursor_idx,
+            )
+            for run_start, run_stop in self.runs(start, stop)
+        ]
 
     def append(self, text: str, column: int) -> int:
         """Append text to line at position column"""
 
+        n = len(text)
         i = column - 1
-        for ch in text:
-            tc = TerminalCharacter(ch, self.tas)
-            try:
-                self.line[i] = tc
-            except IndexError:
-                self.line.append(tc)
-            i += 1
+        if i < 0:  # Column 0 wraps around to last character
+            i = max(i + len(self.chars), 0)
+
+        # Overwrites characters and extends line if text passes the end
+        self.chars[i : i + n] = text
+        self.styles[i : i + n] = array("I", [self.tas.style_id()]) * n
+        self.mark_dirty(i, i + n)
         self.update()
-        return i + 1
+        return column + n
 
     def insert_char(self, column: int, n: int) -> None:
         """Insert n space(s) at position column"""
-        for i in range(n):
-            tc = TerminalCharacter(" ", self.tas)
-            self.line.insert(column - 1, tc)
+        i = column - 1
+        self.chars[i:i] = [" "] * n
+        self.styles[i:i] = array("I", [self.tas.style_id()]) * n
+        self.mark_dirty(i, len(self.chars))
         self.update()
 
     def delete_char(self, column: int, n: int) -> None:
         """Delete n characters at position column"""
-        for i in range(column, column + n):
-            # print(f"Deleting: {self.line[i-1].ch}")
-            self.line.pop(i - 1)
+        self.mark_dirty(column - 1, len(self.chars))
+        del self.chars[column - 1 : column - 1 + n]
+        del self.styles[column - 1 : column - 1 + n]
         self.update()
 
     def erase_in_line(self, column: int, mode: int) -> None:
@@ -786,30 +1063,119 @@ class TerminalLine:
                          3 = erase entire line
         """
         if mode == 0:  # erase after column
-            erase_range = range(column - 1, len(self.line))
+            start, stop = column - 1, max(len(self.chars), column - 1)
         elif mode == 1:  # erase before column
-            erase_range = range(0, column)
+            start, stop = 0, column
         elif mode == 2:  # erase entire line
-            erase_range = range(0, len(self.line))
+            start, stop = 0, len(self.chars)
 
-        for i in erase_range:
-            try:
-                self.line[i] = TerminalCharacter(" ", self.tas)
-            except IndexError:
-                self.line.append(TerminalCharacter(" ", self.tas))
+        self.fill(start, stop, self.tas.style_id())
         self.update()
 
+    @property
+    def text(self) -> str:
+        """Line text, joined on first access after a change"""
+        if self.text_cache is None:
+            self.text_cache = "".join(self.chars)
+        return self.text_cache
+
+    def touch(self) -> None:
+        """Mark line as changed, adding it once to the touched list"""
+        if self.changed is False and self.touched is not None:
+            self.touched.append(self)
+        self.changed = True
+
     def update(self):
         """Update line status"""
-        self.changed = True
-        self.text = str(self)
+        self.touch()
+        self.text_cache = None
+
+
+class LineRing:
+    """Fixed capacity ring buffer of terminal lines.
+
+    Index 0 is the newest (bottom) line, index rows - 1 the top row of the
+    screen and higher indices are scrollback. Negative indices count from the
+    oldest line, as for a list. Pushing a line when the ring is full evicts
+    the oldest line.
+    """
+
+    def __init__(self, rows: int, scrollback: int = 0) -> None:
+        self.rows = rows
+        self.capacity = rows + scrollback
+        self.buf: list[TerminalLine] = [None] * self.capacity
+        self.head: int = 0  # Position of newest line in buf
+        self.count: int = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> TerminalLine:
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError(f"LineRing index {index} out of range")
+        return self.buf[(self.head + index) % self.capacity]
+
+    def __setitem__(self, index: int, line: TerminalLine) -> None:
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError(f"LineRing index {index} out of range")
+        self.buf[(self.head + index) % self.capacity] = line
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.buf[(self.head + i) % self.capacity]
+
+    def push(self, line: TerminalLine) -> None:
+        """Add line as the newest line, evicting the oldest if full"""
+        self.head = (self.head - 1) % self.capacity
+        self.buf[self.head] = line
+        if self.count < self.capacity:
+            self.count += 1
+
+    def row(self, row: int) -> TerminalLine:
+        """Return line at screen row, 1 is the top row"""
+        return self[self.rows - row]
+
+    def screen(self):
+        """Iterate over the lines currently on screen, bottom row first"""
+        for i in range(min(self.rows, self.count)):
+            yield self.buf[(self.head + i) % self.capacity]
+
+    def oldest_first(self):
+        """Iterate over all lines, oldest scrollback line first"""
+        for i in range(self.count - 1, -1, -1):
+            yield self.buf[(self.head + i) % self.capacity]
+
+
+@dataclass
+class TerminalUpdate:
+    """Changes made by one call to TerminalState.update"""
+
+    lines: list[TerminalLine] = field(default_factory=list)  # Changed, oldest first
+    scroll: int = 0  # Lines added at the bottom, scrolling the screen up
+    # Regions scrolled, as (top line id, bottom line id, rows up or down if < 0)
+    scrolls: list[tuple[int, int, int]] = field(default_factory=list)
+    cursor: TerminalCoordinate = field(default_factory=TerminalCoordinate)
+    cursor_visible: bool = False
+    responses: list[EscapeObj] = field(default_factory=list)  # To send to device
+    alt_screen: bool = False  # Lines are on the alternate screen
+
+    def spans(self) -> dict[int, tuple[int, int]]:
+        """Return dirty cell range of every changed line, by line id"""
+        return {line.id: line.dirty_span() for line in self.lines}
 
 
 class TerminalState:
     """Terminal state class"""
 
-    def __init__(self, rows: int = 24, columns: int = 80) -> None:
+    def __init__(
+        self, rows: int = 24, columns: int = 80, scrollback: int = 1000
+    ) -> None:
         self.tokenizer = EscapeTokenizer()
+        self.escape_cache = EscapeCache()
         self.line_id: int = 0
         # self.palette = PaletteVSCodeL
         # self.palette = PaletteXtermL
@@ -817,9 +1183,21 @@ class TerminalState:
         self.palette = PalettePutty
         self.tas = TerminalAttributeState(palette=self.palette)
         self.cursor_visible: bool = False
-        self.terminal_response_list: list[Any] = []
+        self.responses: list[EscapeObj] = []
+        self.scrolls: list[tuple[int, int, int]] = []
+        self.scrollback = scrollback
+        self.scrolled: int = 0  # Lines added since last update
         self.set_terminal(rows, columns)
         self.reset()
+        STYLES.register(self)
+
+    def style_lines(self):
+        """Iterate over lines holding style ids, of both screens"""
+        yield from self.lines
+        yield from self.touched
+        if self.main_screen is not None:
+            yield from self.main_screen[0]
+            yield from self.main_screen[1]
 
     def set_cursor_visible(self, visible: bool) -> None:
         self.cursor_visible = visible
@@ -872,24 +1250,165 @@ class TerminalState:
 
         return Palette256[color]["hex"]
 
+    def get_extended_color(self, color: int | str) -> str:
+        """Return 256 color, truecolor is already decoded to #rrggbb"""
+        if isinstance(color, str):
+            return color
+
+        return self.get_256_color(color)
+
     def set_terminal(self, rows: int, columns: int) -> None:
         """Set terminal size"""
         self.rows = rows
         self.columns = columns
 
+    def resize(self, rows: int, columns: int) -> None:
+        """Change terminal size, keeping lines and their ids.
+
+        The bottom row stays in place. Growing the screen brings back lines
+        from scrollback, or adds blank lines at the bottom when there are
+        too few. Lines are padded to the new width but never cut, as text
+        beyond the last column is kept by the lines anyway.
+        """
+        rows = max(rows, 1)
+        columns = max(columns, 1)
+        if rows == self.max.row and columns == self.max.column:
+            return
+
+        old_rows = self.max.row
+        self.set_terminal(rows, columns)
+        self.max = TerminalCoordinate(rows, columns)
+        self.fit_lines()
+        self.resized = True  # Screen is redrawn by next update
+        self.scroll_top = 1
+        self.scroll_bottom = rows
+
+        self.cursor.row = min(max(self.cursor.row + rows - old_rows, 1), rows)
+        self.cursor.column = min(self.cursor.column, columns)
+        self.saved_cursor.row = min(
+            max(self.saved_cursor.row + rows - old_rows, 1), rows
+        )
+        self.saved_cursor.column = min(self.saved_cursor.column, columns)
+
+    def fit_lines(self) -> None:
+        """Fit lines of the active screen to the terminal size"""
+        scrollback = 0 if self.alt_screen else self.scrollback
+        if self.lines.rows != self.max.row or self.lines.capacity != (
+            self.max.row + scrollback
+        ):
+            lines = LineRing(self.max.row, scrollback)
+            for line in self.lines.oldest_first():
+                lines.push(line)
+            self.lines = lines
+            while len(self.lines) < self.max.row:
+                self.new_line()
+
+        for line in self.lines.screen():
+            if len(line) < self.max.column:
+                line.fill(len(line), self.max.column, line.styles[-1])
+
+    def redraw(self) -> None:
+        """Mark all rows of the screen as changed"""
+        for line in self.lines.screen():
+            line.mark_dirty(0, len(line))
+            line.update()
+
+    def save_cursor(self) -> None:
+        """Save cursor and attributes (DECSC)"""
+        self.saved_cursor = copy(self.cursor)
+        self.saved_tas = copy(self.tas)
+
+    def restore_cursor(self) -> None:
+        """Restore cursor and attributes (DECRC)"""
+        self.cursor = copy(self.saved_cursor)
+        # Lines keep a reference to tas, so it is updated and not replaced
+        self.tas.__dict__.update(self.saved_tas.__dict__)
+
+    def set_alt_screen(self, alt: bool) -> None:
+        """Switch between the main and the alternate screen (xterm 1049).
+
+        The alternate screen starts blank and has no scrollback. The cursor
+        is saved on entry and restored on exit. The main screen is left as
+        it is meanwhile, its changes not yet reported when entering are
+        reported together with the redrawn main screen on exit. Alternate
+        screen line ids continue from the main screen and are reused by it
+        after exit.
+        """
+        if alt == self.alt_screen:
+            return
+
+        if alt:
+            self.save_cursor()
+            self.main_screen = (
+                self.lines,
+                self.touched,
+                self.scrolls,
+                self.scrolled,
+                self.line_id,
+            )
+            self.alt_screen = True
+            self.touched = []
+            self.scrolls = []
+            self.lines = LineRing(self.max.row)
+            for _ in range(0, self.max.row):
+                self.new_line()
+            self.scrolled = 0
+            return
+
+        self.lines, self.touched, self.scrolls, self.scrolled, self.line_id = (
+            self.main_screen
+        )
+        self.main_screen = None
+        self.alt_screen = False
+        self.fit_lines()  # Terminal may have been resized meanwhile
+        self.redraw()
+        self.restore_cursor()
+
     def reset(self):
+        self.alt_screen = False
+        self.main_screen = None
         self.cursor = TerminalCoordinate()
         self.saved_cursor = TerminalCoordinate()
         self.max = TerminalCoordinate(self.rows, self.columns)
-        self.lines: list[TerminalLine] = []
+        self.touched: list[TerminalLine] = []  # Lines changed since last update
+        self.resized = False
+        self.lines = LineRing(self.max.row, self.scrollback)
         for _ in range(0, self.max.row):
             self.new_line()
+        self.scrolled = 0  # Initial screen is not scrolling
+        self.scroll_top = 1
+        self.scroll_bottom = self.max.row
         self.tokenizer.clear()
         self.reset_attr()
+        self.saved_tas = copy(self.tas)
 
     def reset_attr(self):
         self.tas.reset()
 
+    def text(self) -> str:
+        """Return text of all lines including scrollback, oldest line first"""
+        return "\n".join(line.text.rstrip() for line in self.lines.oldest_first())
+
+    def find(self, pattern: str, regex: bool = False) -> list[tuple[int, int]]:
+        """Search all lines for pattern.
+
+        Args:
+            pattern (str): Text, or regular expression if regex is True
+            regex (bool): Treat pattern as a regular expression
+
+        Returns:
+            list[tuple[int, int]]: (line id, column) of every match, oldest first
+        """
+        if not regex:
+            pattern = re.escape(pattern)
+        exp = re.compile(pattern)
+
+        matches = []
+        for line in self.lines.oldest_first():
+            for m in exp.finditer(line.text):
+                matches.append((line.id, m.start() + 1))
+        return matches
+
     def pos_str(self) -> str:
         """Return cursor position as string"""
         ps = f"{self.cursor}"
@@ -897,78 +1416,132 @@ class TerminalState:
 
     def new_line(self) -> TerminalLine:
 
-        nl = TerminalLine(tas=self.tas, id=self.line_id, columns=self.max.column)
+        nl = TerminalLine(
+            tas=self.tas, id=self.line_id, columns=self.max.column, touched=self.touched
+        )
         nl.append(" ", 0)  # For some reason needed
         self.line_id += 1
-        self.lines.insert(0, nl)
+        self.scrolled += 1
+        self.lines.push(nl)
         return nl
 
-    def delete_line(self, n: int = 1) -> None:
-        """Delete n row(s) at cursor, existing rows scroll up"""
-        for i in range(self.max.row - self.cursor.row, -1, -1):
-            self.lines[i].line = self.lines[i - 1].line
-            self.lines[i].changed = True
+    def set_scroll_region(self, top: int, bottom: int) -> None:
+        """Set rows scrolled by linefeed, IL, DL, SU and SD (DECSTBM).
+        Bottom 0 is the last row, a region of less than two rows is ignored."""
+        if bottom == 0 or bottom > self.max.row:
+            bottom = self.max.row
+        top = max(top, 1)
+        if top >= bottom:
+            return
+        self.scroll_top = top
+        self.scroll_bottom = bottom
+        self.set_cursor(column=1, row=1)
+
+    def scroll_region(self, n: int, top: int = None, scrollback: bool = False) -> None:
+        """Scroll rows from top to bottom of the scroll region up n rows, or
+        down if n is negative. Blank rows fill in, rows scrolled out are lost
+        unless scrollback is set and the region is the whole screen.
+
+        Line objects are rotated within the region and given back the ids of
+        their new rows, so line ids stay in row order. Renderers apply the
+        scroll from TerminalUpdate.scrolls and only redraw the blank rows.
+        """
+        top = self.scroll_top if top is None else top
+        bottom = self.scroll_bottom
+        if n == 0 or top >= bottom + 1:
+            return
+
+        if (
+            scrollback
+            and not self.alt_screen
+            and n > 0
+            and top == 1
+            and bottom == self.max.row
+        ):
+            for _ in range(min(n, self.lines.capacity)):
+                self.new_line()
+            return
+
+        size = bottom - top + 1
+        n = max(min(n, size), -size)
+        region = [self.lines.row(row) for row in range(top, bottom + 1)]
+        ids = [line.id for line in region]
+        region = region[n:] + region[:n]
+        for row, line, line_id in zip(range(top, bottom + 1), region, ids):
+            line.id = line_id
+            self.lines[self.max.row - row] = line
+        blank_rows = range(bottom - n + 1, bottom + 1) if n > 0 else range(top, top - n)
+        for row in blank_rows:
+            self.clear_line(row)
+
+        # Scrolls of the same region in one update are applied as one
+        if len(self.scrolls) > 0 and self.scrolls[-1][:2] == (ids[0], ids[-1]):
+            n = max(min(self.scrolls[-1][2] + n, size), -size)
+            self.scrolls.pop()
+        if n != 0:
+            self.scrolls.append((ids[0], ids[-1], n))
 
-        self.clear_line(self.max.row)
+    def delete_line(self, n: int = 1) -> None:
+        """Delete n row(s) at cursor, rows below in scroll region scroll up"""
+        if self.scroll_top <= self.cursor.row <= self.scroll_bottom:
+            self.scroll_region(max(n, 1), top=self.cursor.row)
+            self.set_cursor(column=1)
 
     def clear_line(self, line: int) -> None:
         """Clear line at position line"""
-        self.lines[self.max.row - line].clear()
+        self.lines.row(line).clear()
 
         # For some reason the following line is needed.
         # A guess is that it might have with html rendering to do
-        self.lines[self.max.row - line].append(" ", 1)
+        self.lines.row(line).append(" ", 1)
 
     def insert_line(self, n: int = 1) -> None:
-        """insert n row(s) at cursor, existing rows scroll down"""
-
-        pos = self.max.row - self.cursor.row
-        logging.debug(f"Insert at: {pos}")
+        """Insert n row(s) at cursor, rows below in scroll region scroll down"""
+        if Trace.CSI:
+            logging.debug(f"Insert at: {self.cursor.row}")
 
-        for i in range(0, pos + 1):
-            self.lines[i].line = self.lines[i + 1].line
-            self.lines[i].changed = True
-
-        self.clear_line(self.cursor.row)
+        if self.scroll_top <= self.cursor.row <= self.scroll_bottom:
+            self.scroll_region(-max(n, 1), top=self.cursor.row)
+            self.set_cursor(column=1)
 
     def insert_char(self, n: int = 1) -> None:
         """Insert n characters at cursor position"""
-        self.lines[self.max.row - self.cursor.row].insert_char(self.cursor.column, n)
+        self.lines.row(self.cursor.row).insert_char(self.cursor.column, n)
 
     def delete_char(self, n: int = 1) -> None:
         """Delete n characters at cursor position"""
-        self.lines[self.max.row - self.cursor.row].delete_char(self.cursor.column, n)
+        self.lines.row(self.cursor.row).delete_char(self.cursor.column, n)
 
     def erase_in_line(self, mode: int) -> None:
         """Erase in line"""
-        logging.debug(
-            f"Erase in line: {self.cursor.row=}  {self.cursor.column=} {mode=}"
-        )
-        self.lines[self.max.row - self.cursor.row].erase_in_line(
-            self.cursor.column, mode
-        )
+        if Trace.CSI:
+            logging.debug(
+                f"Erase in line: {self.cursor.row=}  {self.cursor.column=} {mode=}"
+            )
+        self.lines.row(self.cursor.row).erase_in_line(self.cursor.column, mode)
 
     def erase_in_display(self, mode: int) -> None:
         """Erase in display"""
         if mode == 0:  # Clear from cursor to end of screen
             for line in range(self.cursor.row, self.max.row + 1):
-                self.lines[self.max.row - line].erase_in_line(1, 2)
+                self.lines.row(line).erase_in_line(1, 2)
         elif mode == 1:  # Clear from cursor to beginning of screen
             for line in range(1, self.cursor.row):
-                self.lines[self.max.row - line].erase_in_line(1, 2)
+                self.lines.row(line).erase_in_line(1, 2)
         elif mode == 2:  # Clear entire screen
             for line in range(1, self.max.row):
-                self.lines[self.max.row - line].erase_in_line(1, 2)
+                self.lines.row(line).erase_in_line(1, 2)
         elif mode == 3:  # Clear saved lines
             logging.debug(f"UNSUPPORTED: Erase in display mode 3 not implemented")
 
     def append(self, text: str) -> None:
         """Append text to terminal line"""
-        self.cursor.column = self.lines[self.max.row - self.cursor.row].append(
+        self.cursor.column = self.lines.row(self.cursor.row).append(
             text, self.cursor.column
         )
-        tok_str = f'"{text}"'
-        logging.debug(f"(Text): {tok_str}")
+        if Trace.TOKENIZER:
+            tok_str = f'"{text}"'
+            logging.debug(f"(Text): {tok_str}")
 
     def handle_sgr(self, eo: EscapeObj) -> None:
         """Handle Select Graphic Rendition (SGR)"""
@@ -1053,10 +1626,10 @@ class TerminalState:
                 self.tas.BG_COLOR = self.bg_color(sgr.type)
 
             elif sgr.type == SGRType.SET_FG_COLOR:
-                self.tas.FG_COLOR = self.get_256_color(sgr.color)
+                self.tas.FG_COLOR = self.get_extended_color(sgr.color)
 
             elif sgr.type == SGRType.SET_BG_COLOR:
-                self.tas.BG_COLOR = self.get_256_color(sgr.color)
+                self.tas.BG_COLOR = self.get_extended_color(sgr.color)
 
             elif sgr.type == SGRType.SET_FG_COLOR_DEFAULT:
                 self.tas.FG_COLOR = self.tas.DEFAULT_FG_COLOR
@@ -1143,7 +1716,13 @@ class TerminalState:
             self.delete_char(eo.n)
 
         if eo.csitype == CSIType.SET_SCROLLING_REGION:
-            logging.debug(f"{eo.csitype.name} is UNSUPPORTED")
+            self.set_scroll_region(eo.n, eo.m)
+
+        if eo.csitype == CSIType.SCROLL_UP:
+            self.scroll_region(max(eo.n, 1), scrollback=True)
+
+        if eo.csitype == CSIType.SCROLL_DOWN:
+            self.scroll_region(-max(eo.n, 1))
 
         if eo.csitype == CSIType.INSERT_CHARACTER:
             self.insert_char(eo.m)
@@ -1154,7 +1733,7 @@ class TerminalState:
         if eo.csitype == CSIType.PRIMARY_DEVICE_ATTRIBUTES:
             rsp = f"{Ansi.CSI}?64;c"  # 64 = service class for VT510
             response = EscapeObj(type=C1Type.RESPONSE, text=rsp)
-            self.terminal_response_list.append(response)
+            self.responses.append(response)
 
         if eo.csitype == CSIType.ENABLE:
             self.handle_private_sequence(eo, True)
@@ -1169,31 +1748,38 @@ class TerminalState:
             # self.cursor_visible = state
             self.set_cursor_visible(state)
 
+        if eo.private_sequence == PrivateSequence.ALT_SCREEN_BUFFER:
+            self.set_alt_screen(state)
+
         if eo.private_sequence == PrivateSequence.BRACKEDED_PASTE_MODE:
             logging.debug(f"{eo.private_sequence} is UNSUPPORTED")
 
-    def update(self, data: str) -> list:
-        """Update terminal state with data"""
-        self.terminal_response_list.clear()
-        last_line_id = self.lines[0].id
+    def update(self, data: str) -> TerminalUpdate:
+        """Update terminal state with data, return the changes"""
+        self.responses = []
+        self.scrolls = []
         self.tokenizer.append_string(data)
-        for line in self.lines:
+
+        # Only lines touched in last update can be changed or hold the cursor
+        for line in self.touched:
             line.reset()
-        # for i in range(0, self.max.row):
-        #     self.lines[i].reset()
+        had_cursor = [line for line in self.touched if line.old_cursor is not None]
+        self.touched.clear()
+        if self.resized:
+            self.resized = False
+            self.redraw()
 
         for token in self.tokenizer:
             if Ansi.is_escape_seq(token):
-                eo = EscapeObj()
-                eo.decode(token)
+                eo = self.escape_cache.decode(token)
+                if Trace.CSI or Trace.SGR:  # Cached sequences are traced too
+                    eo.trace()
 
                 if eo.type == C1Type.DECSC:  # Save cursor and attributes
-                    self.saved_cursor = copy(self.cursor)
-                    self.saved_tas = copy(self.tas)
+                    self.save_cursor()
 
                 if eo.type == C1Type.DECRC:  # Restore cursor and attributes
-                    self.cursor = copy(self.saved_cursor)
-                    self.tas = copy(self.saved_tas)
+                    self.restore_cursor()
 
                 if eo.type == C1Type.CSI:
                     self.handle_csi(eo)
@@ -1202,21 +1788,25 @@ class TerminalState:
 
             if token == Ascii.CR:  # carriage return
                 self.set_cursor(column=1)
-                logging.debug(f"(CR)    Carriage Return {self.pos_str()}")
+                if Trace.TOKENIZER:
+                    logging.debug(f"(CR)    Carriage Return {self.pos_str()}")
                 continue
 
             if token == Ascii.BS:  # backspace
                 self.set_cursor(column=(self.cursor.column - 1))
-                logging.debug(f"(BS)    Backspace       {self.pos_str()}")
+                if Trace.TOKENIZER:
+                    logging.debug(f"(BS)    Backspace       {self.pos_str()}")
                 continue
 
             if token == Ascii.LF:  # newline
-                if (self.cursor.row) >= self.max.row:
-                    self.new_line()
-
-                self.set_cursor(column=1, row=(self.cursor.row + 1))
-
-                logging.debug(f"(LF)    Linefeed        {self.pos_str()}")
+                if self.cursor.row == self.scroll_bottom:
+                    self.scroll_region(1, scrollback=True)
+                    self.set_cursor(column=1)
+                else:
+                    self.set_cursor(column=1, row=(self.cursor.row + 1))
+
+                if Trace.TOKENIZER:
+                    logging.debug(f"(LF)    Linefeed        {self.pos_str()}")
                 continue
 
             if token in [Ascii.BEL]:  # bell
@@ -1225,27 +1815,46 @@ class TerminalState:
             # Adding normal text
             self.append(token)
 
-        # Find rows that need to be updated
-        lines_to_update = self.lines[0].id - (last_line_id) + 24
-        for i in range(lines_to_update - 1, -1, -1):
+        # Lines that lost the cursor are redrawn
+        for line in had_cursor:
+            line.has_changed(None)
 
-            if self.lines[i].has_changed(None) is True:
-                self.terminal_response_list.append(self.lines[i])
+        # Lines touched by this update, lines pushed out of the ring are skipped
+        oldest_id = self.lines[-1].id
+        lines = sorted(
+            (line for line in self.touched if line.id >= oldest_id),
+            key=lambda line: line.id,
+        )
 
         if self.cursor_visible is True:
-            self.lines[24 - self.cursor.row].set_cursor(self.cursor)
-            self.terminal_response_list.append(self.lines[24 - self.cursor.row])
-
-        logging.debug(
-            f"Changed lines:{len(self.terminal_response_list)}  Last Id={self.line_id-1}  Cursor={self.cursor}"
+            cursor_line = self.lines.row(self.cursor.row)
+            if cursor_line.changed is False:  # Not already in list
+                lines.append(cursor_line)
+            cursor_line.set_cursor(self.cursor)
+
+        result = TerminalUpdate(
+            lines=lines,
+            scroll=self.scrolled,
+            cursor=copy(self.cursor),
+            cursor_visible=self.cursor_visible,
+            responses=self.responses,
+            scrolls=self.scrolls,
+            alt_screen=self.alt_screen,
         )
-        return self.terminal_response_list
+        self.scrolled = 0
+
+        if Trace.TOKENIZER:
+            logging.debug(
+                f"Changed lines:{len(lines)}  Scroll:{result.scroll}  Last Id={self.line_id-1}  Cursor={self.cursor}"
+            )
+        return result
 
 
 def main() -> None:
     logging.basicConfig(
         format="[%(levelname)s] Line: %(lineno)d %(message)s", level=logging.DEBUG
     )
+    Trace.enable(Trace.categories)
     # print(Ansi.color_test())
     print(Ansi.test())
 
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Regression tests of the terminal model
+#
+# File:     terminal_test.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:
+# Date:     2026-10-18
+# License:  MIT
+# Python:   >= 3.0
+#
+# ----------------------------------------------------------------------------
+#
+# Run with "python3 test/terminal_test.py".
+#
+
+# Imports --------------------------------------------------------------------
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from terminal import STYLES, TerminalState
+
+# Code -----------------------------------------------------------------------
+
+
+def cell_colors(ts: TerminalState, row: int, start: int, stop: int) -> list[str]:
+    """Return foreground colors of cells in range start to stop of screen row"""
+    line = ts.lines.row(row)
+    return [STYLES[style_id].fg_color for style_id in line.styles[start:stop]]
+
+
+class TestAltScreen(unittest.TestCase):
+    def test_sgr_after_leaving_alt_screen(self):
+        """Lines of the main screen must follow attributes set after leaving"""
+        ts = TerminalState()
+        ts.update("hello\r\n\x1b[?1049hALT\x1b[?1049l\x1b[31mRED")
+
+        line = ts.lines.row(2)
+        self.assertIs(line.tas, ts.tas)
+        self.assertEqual("".join(line.chars[:3]), "RED")
+        self.assertEqual(cell_colors(ts, 2, 0, 3), [ts.palette[1]] * 3)
+
+
+class TestTruecolor(unittest.TestCase):
+    def test_truecolor(self):
+        ts = TerminalState()
+        ts.update("\x1b[38;2;255;0;16mX")
+        self.assertEqual(cell_colors(ts, 1, 0, 1), ["#ff0010"])
+
+    def test_short_truecolor_is_ignored(self):
+        ts = TerminalState()
+        ts.update("\x1b[38;2;255mX\x1b[48;2;;;mY")
+        self.assertEqual("".join(ts.lines.row(1).chars[:2]), "XY")
+        self.assertEqual(cell_colors(ts, 1, 0, 2), [ts.tas.DEFAULT_FG_COLOR] * 2)
+
+    def test_out_of_range_truecolor_is_clamped(self):
+        ts = TerminalState()
+        ts.update("\x1b[38;2;300;0;1000mX")
+        self.assertEqual(cell_colors(ts, 1, 0, 1), ["#ff00ff"])
+
+
+def main() -> None:
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()